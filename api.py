@@ -0,0 +1,405 @@
+# api.py — Yassaka | API JSON (Flask) para integrações, sobre as mesmas funções de db.py
+#
+# Rodar:  gunicorn -w 4 -b 0.0.0.0:8000 'api:app'   (dev: flask --app api run)
+#         Sem --preload: cada worker importa o módulo e abre a sua thread de
+#         LISTEN (db.iniciar_ouvinte); threads do master não sobrevivem ao fork.
+#
+# - Autenticação: POST /api/token com {"username", "password"} devolve um token
+#   (o banco guarda só o sha256); as outras rotas pedem "Authorization: Bearer <token>".
+# - Listagens (GET /api/<recurso>): keyset com ?limit=&before_id=; "proximo" é o
+#   before_id da página seguinte (null = acabou). Toda resposta leva ETag: com
+#   If-None-Match igual volta 304 sem corpo (e, com o cache de leituras de db.py,
+#   sem ida ao banco).
+# - Escritas (POST /api/<recurso>): um objeto grava na hora e devolve a linha;
+#   uma lista (até API_LOTE_MAX) vai numa transação só (db.aplicar_escritas),
+#   cada item com sua chave de idempotência ("chave", UUID; gerada se faltar) —
+#   reenviar o mesmo lote depois de um erro de rede não duplica nada.
+# - Feed de mudanças para o Power BI (GET /api/mudancas/<recurso>?desde=&formato=),
+#   só admin: ver mudancas.py.
+# - Dump completo da tabela (GET /api/exportacao/<recurso>?formato=csv|parquet),
+#   só admin: ver exportacao.py.
+# As regras de dono são as da UI: cada um lista o que é seu (admin, tudo) e
+# contatos/reuniões/atestados ficam sempre no nome do dono do token.
+import hashlib
+import secrets
+import tempfile
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+import psycopg2
+from flask import Flask, g, jsonify, request, send_file
+
+from autenticacao import LoginBloqueado, LoginOcupado, autenticar_usuario
+from db import (
+    PoolEsgotado,
+    _get_setting,
+    aplicar_escritas,
+    conexao,
+    ensure_schema,
+    finalizar_rerun,
+    iniciar_ouvinte,
+    iniciar_rerun,
+    inserir_atestado,
+    inserir_contato,
+    inserir_reuniao,
+    inserir_token_api,
+    listar_atestados,
+    listar_contatos_visiveis,
+    listar_propostas,
+    listar_reunioes_visiveis,
+    neon_url_configurada,
+    registrar_proposta,
+    revogar_token_api,
+    usuario_do_token,
+)
+from exportacao import TABELAS_EXPORTAVEIS, exportar
+from mudancas import FORMATOS, WatermarkExpirado, exportar_mudancas
+
+API_LIMITE_PADRAO = 50
+API_LIMITE_MAX = int(_get_setting("API_LIMITE_MAX", 200))
+API_LOTE_MAX = int(_get_setting("API_LOTE_MAX", 1000))
+API_TOKEN_DIAS = int(_get_setting("API_TOKEN_DIAS", 90))
+
+app = Flask(__name__)
+app.json.sort_keys = False
+
+class ErroEntrada(ValueError):
+    pass
+
+# ----------------------------------------------------------------------------
+# Serialização
+# ----------------------------------------------------------------------------
+def _valor_json(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+def _linha(colunas, linha) -> dict:
+    return {c: _valor_json(v) for c, v in zip(colunas, linha)}
+
+# ----------------------------------------------------------------------------
+# Validação das escritas: corpo JSON -> kwargs das funções de db.py
+# ----------------------------------------------------------------------------
+def _texto(item: dict, campo: str, padrao: str | None = None, maximo: int = 200) -> str:
+    valor = item.get(campo, padrao)
+    if not isinstance(valor, str) or not valor.strip():
+        raise ErroEntrada(f"'{campo}' é obrigatório.")
+    if len(valor.strip()) > maximo:
+        raise ErroEntrada(f"'{campo}' passa de {maximo} caracteres.")
+    return valor.strip()
+
+def _data(item: dict, campo: str, padrao: date | None = None) -> date:
+    valor = item.get(campo)
+    if valor is None and padrao is not None:
+        return padrao
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ErroEntrada(f"'{campo}' deve ser uma data AAAA-MM-DD.") from None
+
+def _args_proposta(item: dict, usuario: str) -> dict:
+    try:
+        valor = Decimal(str(item.get("valor")))
+    except InvalidOperation:
+        raise ErroEntrada("'valor' deve ser numérico (ex.: 1234.56).") from None
+    if not valor.is_finite() or valor < 0:
+        raise ErroEntrada("'valor' deve ser um número positivo.")
+    turmas = item.get("turmas", 1)
+    if not isinstance(turmas, int) or isinstance(turmas, bool) or turmas < 1:
+        raise ErroEntrada("'turmas' deve ser um inteiro >= 1.")
+    qmf = item.get("qmf", "M")
+    if qmf not in ("Q", "M", "F"):
+        raise ErroEntrada("'qmf' deve ser Q, M ou F.")
+    return {
+        "cliente": _texto(item, "cliente", maximo=150),
+        "produto": _texto(item, "produto", maximo=120),
+        "valor": str(valor.quantize(Decimal("0.01"))),
+        "turmas": turmas,
+        "head_responsavel": _texto(item, "head_responsavel", usuario, maximo=100),
+        "qmf": qmf,
+    }
+
+def _args_contato(item: dict, usuario: str) -> dict:
+    return {
+        "owner_username": usuario,
+        "data_contato": _data(item, "data", date.today()),
+        "cliente": _texto(item, "cliente"),
+        "responsavel": _texto(item, "responsavel", usuario, maximo=150),
+    }
+
+def _args_reuniao(item: dict, usuario: str) -> dict:
+    return {
+        "owner_username": usuario,
+        "data_reuniao": _data(item, "data", date.today()),
+        "cliente": _texto(item, "cliente"),
+        "responsavel": _texto(item, "responsavel", usuario, maximo=150),
+    }
+
+def _args_atestado(item: dict, usuario: str) -> dict:
+    return {
+        "owner_username": usuario,
+        "mes": _data(item, "mes").replace(day=1),
+        "cliente": _texto(item, "cliente"),
+        "projeto_finalizado": _texto(item, "projeto_finalizado", maximo=2000),
+        "atestado_conquistado": _texto(item, "atestado_conquistado", maximo=2000),
+    }
+
+# recurso -> operação (db.ESCRITAS), kwargs, escrita avulsa, listagem, colunas das linhas
+RECURSOS = {
+    "propostas": (
+        "proposta", _args_proposta, registrar_proposta,
+        lambda usuario, role, limit, before_id: listar_propostas(usuario, role, limit, before_id),
+        ("id", "cliente", "produto", "valor", "turmas", "head_responsavel", "qmf", "criado_em"),
+    ),
+    "contatos": (
+        "contato", _args_contato, inserir_contato,
+        lambda usuario, role, limit, before_id: listar_contatos_visiveis(usuario, role, limit, before_id),
+        ("id", "data", "cliente", "responsavel", "criado_em"),
+    ),
+    "reunioes": (
+        "reuniao", _args_reuniao, inserir_reuniao,
+        lambda usuario, role, limit, before_id: listar_reunioes_visiveis(usuario, role, limit, before_id),
+        ("id", "data", "cliente", "responsavel", "criado_em"),
+    ),
+    "atestados": (
+        "atestado", _args_atestado, inserir_atestado,
+        lambda usuario, role, limit, before_id: listar_atestados(usuario, limit, before_id),
+        ("id", "mes", "cliente", "projeto_finalizado", "atestado_conquistado", "criado_em"),
+    ),
+}
+
+# ----------------------------------------------------------------------------
+# Autenticação por token
+# ----------------------------------------------------------------------------
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _erro(status: int, mensagem: str, **headers):
+    resp = jsonify({"erro": mensagem})
+    resp.status_code = status
+    resp.headers.update(headers)
+    return resp
+
+def requer_token(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        tipo, _, token = request.headers.get("Authorization", "").partition(" ")
+        if tipo.lower() != "bearer" or not token.strip():
+            return _erro(401, "Envie 'Authorization: Bearer <token>'.", **{"WWW-Authenticate": "Bearer"})
+        g.token_hash = _hash_token(token.strip())
+        usuario = usuario_do_token(g.token_hash)
+        if usuario is None:
+            return _erro(401, "Token inválido, expirado ou revogado.", **{"WWW-Authenticate": "Bearer"})
+        g.usuario, g.role = usuario
+        return fn(*args, **kwargs)
+    return wrapper
+
+@app.post("/api/token")
+def criar_token():
+    corpo = request.get_json(silent=True) or {}
+    try:
+        auth = autenticar_usuario(corpo.get("username"), corpo.get("password"))
+    except LoginBloqueado as e:
+        return _erro(429, str(e), **{"Retry-After": str(int(e.restante) + 1)})
+    except LoginOcupado as e:
+        return _erro(503, str(e), **{"Retry-After": "5"})
+    if not auth:
+        return _erro(401, "Usuário ou senha inválidos.")
+    token = secrets.token_urlsafe(32)
+    descricao = corpo.get("descricao")
+    inserir_token_api(
+        auth["username"], _hash_token(token),
+        descricao[:200] if isinstance(descricao, str) else None, API_TOKEN_DIAS or None,
+    )
+    return jsonify({"token": token, "username": auth["username"], "role": auth["role"],
+                    "validade_dias": API_TOKEN_DIAS or None}), 201
+
+@app.delete("/api/token")
+@requer_token
+def revogar_token():
+    revogar_token_api(g.token_hash)
+    return "", 204
+
+# ----------------------------------------------------------------------------
+# Recursos
+# ----------------------------------------------------------------------------
+def _inteiro_param(nome: str, padrao=None, minimo: int = 1, maximo: int | None = None):
+    valor = request.args.get(nome)
+    if valor in (None, ""):
+        return padrao
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErroEntrada(f"'{nome}' deve ser inteiro.") from None
+    if valor < minimo:
+        raise ErroEntrada(f"'{nome}' deve ser >= {minimo}.")
+    return min(valor, maximo) if maximo else valor
+
+@app.get("/api/<recurso>")
+@requer_token
+def listar(recurso):
+    if recurso not in RECURSOS:
+        return _erro(404, f"Recurso desconhecido: {recurso}.")
+    *_, listar_fn, colunas = RECURSOS[recurso]
+    limit = _inteiro_param("limit", API_LIMITE_PADRAO, maximo=API_LIMITE_MAX)
+    before_id = _inteiro_param("before_id")
+    linhas = listar_fn(g.usuario, g.role, limit, before_id)
+    resp = jsonify({
+        "itens": [_linha(colunas, l) for l in linhas],
+        "proximo": linhas[-1][0] if len(linhas) == limit else None,
+    })
+    # ETag forte sobre o corpo; "private": cada token enxerga um conjunto diferente
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.headers["Vary"] = "Authorization"
+    return resp.make_conditional(request)
+
+def _chave_item(item: dict) -> str:
+    if not item.get("chave"):
+        return str(uuid.uuid4())
+    try:
+        return str(uuid.UUID(str(item["chave"])))
+    except ValueError:
+        raise ErroEntrada("'chave' deve ser um UUID.") from None
+
+@app.post("/api/<recurso>")
+@requer_token
+def inserir(recurso):
+    if recurso not in RECURSOS:
+        return _erro(404, f"Recurso desconhecido: {recurso}.")
+    operacao, args_fn, escrever_fn, _, colunas = RECURSOS[recurso]
+    corpo = request.get_json(silent=True)
+    if isinstance(corpo, dict):
+        linha = escrever_fn(**args_fn(corpo, g.usuario))
+        return jsonify(_linha(colunas, linha)), 201
+    if not isinstance(corpo, list) or not corpo:
+        raise ErroEntrada("Envie um objeto JSON ou uma lista de objetos.")
+    if len(corpo) > API_LOTE_MAX:
+        return _erro(413, f"Lote acima de {API_LOTE_MAX} itens.")
+
+    # Erros de validação não derrubam o lote: o item volta com o erro
+    itens, resultados = [], []
+    for indice, item in enumerate(corpo):
+        try:
+            if not isinstance(item, dict):
+                raise ErroEntrada("Item não é um objeto JSON.")
+            itens.append((_chave_item(item), operacao, args_fn(item, g.usuario)))
+            resultados.append({"indice": indice, "chave": itens[-1][0], "status": "ok"})
+        except ErroEntrada as e:
+            resultados.append({"indice": indice, "chave": None, "status": "erro", "erro": str(e)})
+    _, falhas = aplicar_escritas(itens) if itens else ([], {})
+    for r in resultados:
+        if r["chave"] in falhas:
+            r.update(status="erro", erro=falhas[r["chave"]])
+    return jsonify({
+        "aplicadas": sum(r["status"] == "ok" for r in resultados),
+        "erros": sum(r["status"] == "erro" for r in resultados),
+        "itens": resultados,
+    })
+
+# ----------------------------------------------------------------------------
+# Feed de mudanças (Power BI) — ver mudancas.py
+# ----------------------------------------------------------------------------
+_MIME = {"csv": "text/csv", "json": "application/json", "parquet": "application/vnd.apache.parquet"}
+
+@app.get("/api/mudancas/<recurso>")
+@requer_token
+def mudancas(recurso):
+    # Visão global dos dados: só admin (a conta de serviço do dataset)
+    if g.role != "admin":
+        return _erro(403, "Só administradores.")
+    if recurso not in RECURSOS:
+        return _erro(404, f"Recurso desconhecido: {recurso}.")
+    formato = request.args.get("formato", "json")
+    if formato not in FORMATOS:
+        raise ErroEntrada(f"'formato' deve ser {', '.join(FORMATOS)}.")
+    desde = _inteiro_param("desde", minimo=0)
+    # Em memória até 16 MiB, depois em disco: o volume é o das mudanças, não o da tabela
+    arquivo = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        with conexao() as conn:
+            proximo = exportar_mudancas(recurso, formato, arquivo, desde, conn)
+    except WatermarkExpirado as e:
+        arquivo.close()
+        return _erro(410, str(e))
+    arquivo.seek(0)
+    resp = send_file(arquivo, mimetype=_MIME[formato], as_attachment=formato != "json",
+                     download_name=f"{recurso}_mudancas_{desde or 0}_{proximo}.{formato}")
+    # O próximo watermark também no cabeçalho (no JSON ele já vem no corpo)
+    resp.headers["X-Proximo-Watermark"] = str(proximo)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+# ----------------------------------------------------------------------------
+# Exportação completa — ver exportacao.py
+# ----------------------------------------------------------------------------
+@app.get("/api/exportacao/<recurso>")
+@requer_token
+def exportacao(recurso):
+    if g.role != "admin":
+        return _erro(403, "Só administradores.")
+    if recurso not in TABELAS_EXPORTAVEIS:
+        return _erro(404, f"Recurso desconhecido: {recurso}.")
+    formato = request.args.get("formato", "csv")
+    if formato not in ("csv", "parquet"):
+        raise ErroEntrada("'formato' deve ser csv ou parquet.")
+    # Do banco para um arquivo em disco e dele para a resposta, em blocos: a
+    # memória não depende do tamanho da tabela
+    arquivo = tempfile.TemporaryFile()
+    try:
+        with conexao() as conn:
+            exportar(recurso, formato, arquivo, conn)
+    except ImportError:
+        arquivo.close()
+        return _erro(501, "Exportação Parquet requer o pacote pyarrow.")
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    resp = send_file(arquivo, mimetype=_MIME[formato], as_attachment=True,
+                     download_name=f"{recurso}_{date.today():%Y%m%d}.{formato}")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+# ----------------------------------------------------------------------------
+# Erros, métricas e schema
+# ----------------------------------------------------------------------------
+@app.errorhandler(ErroEntrada)
+def _erro_entrada(e):
+    return _erro(400, str(e))
+
+@app.errorhandler(psycopg2.DataError)
+@app.errorhandler(psycopg2.IntegrityError)
+def _erro_dado(e):
+    return _erro(422, str(e).strip() or type(e).__name__)
+
+@app.errorhandler(psycopg2.OperationalError)
+@app.errorhandler(psycopg2.InterfaceError)
+@app.errorhandler(PoolEsgotado)
+def _banco_indisponivel(e):
+    # Banco acordando/fora ou pool cheio: o cliente repete (lotes com as mesmas chaves)
+    return _erro(503, "Banco indisponível no momento. Tente novamente.", **{"Retry-After": "5"})
+
+# Cada requisição entra nas métricas de db.py como uma "página" (tempo e nº de consultas)
+@app.before_request
+def _inicio_requisicao():
+    iniciar_rerun()
+
+@app.teardown_request
+def _fim_requisicao(_exc):
+    rota = request.url_rule.rule if request.url_rule else "?"
+    recurso = (request.view_args or {}).get("recurso")
+    if recurso in RECURSOS:
+        rota = rota.replace("<recurso>", recurso)
+    finalizar_rerun(f"API {request.method} {rota}")
+
+if not neon_url_configurada():
+    raise RuntimeError("NEON_URL não configurada (defina no ambiente ou em .env).")
+ensure_schema()
+# Escritas da UI, da fila e de outros workers invalidam o cache (e os ETags) daqui
+# também, sem esperar o TTL; DB_OUVIR=0 desliga
+iniciar_ouvinte()
@@ -0,0 +1,288 @@
+# autenticacao.py — Yassaka | Login: bcrypt fora da thread do script, bloqueio por tentativas e custo calibrado
+#
+# - O bcrypt roda num pool de threads limitado (o bcrypt solta o GIL): no pico
+#   de logins, no máximo LOGIN_WORKERS hashes disputam CPU com o render das
+#   outras sessões; o excedente espera numa fila curta e, cheia, é recusado.
+# - Falhas repetidas bloqueiam o usuário por um tempo; enquanto bloqueado, a
+#   tentativa é recusada antes de qualquer consulta ao banco ou hash.
+# - O custo do bcrypt é calibrado uma vez por processo para ~LOGIN_ALVO_MS; um
+#   login bem-sucedido com hash de custo menor regrava o hash em segundo plano.
+# - Provisionamento em lote (lista colada ou CSV): hashes num pool próprio, do
+#   tamanho dos núcleos, e um único upsert no banco.
+import csv
+import io
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturoTimeout
+
+import bcrypt
+
+from db import (
+    _get_setting,
+    _medida,
+    atualizar_senha_hash,
+    buscar_credenciais,
+    inserir_usuario,
+    upsert_usuarios,
+    usernames_existentes,
+)
+
+LOGIN_WORKERS = int(_get_setting("LOGIN_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Logins além dos workers que podem esperar na fila antes de recusar
+LOGIN_FILA = int(_get_setting("LOGIN_FILA", 32))
+LOGIN_TIMEOUT = float(_get_setting("LOGIN_TIMEOUT", 10))
+LOGIN_ALVO_MS = float(_get_setting("LOGIN_ALVO_MS", 250))
+# Custo fixo (pula a calibração); vazio = calibrar
+BCRYPT_ROUNDS = _get_setting("BCRYPT_ROUNDS")
+BCRYPT_MIN, BCRYPT_MAX = 10, 15
+
+LOGIN_MAX_FALHAS = int(_get_setting("LOGIN_MAX_FALHAS", 5))
+LOGIN_JANELA = float(_get_setting("LOGIN_JANELA", 900))
+LOGIN_BLOQUEIO = float(_get_setting("LOGIN_BLOQUEIO", 900))
+
+# Hashes em paralelo no provisionamento em lote (deixa um núcleo para os reruns)
+LOTE_WORKERS = int(_get_setting("LOTE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+ROLES = ("user", "admin", "educador")
+
+class LoginBloqueado(Exception):
+    def __init__(self, restante: float):
+        super().__init__(f"Muitas tentativas. Tente novamente em {max(1, int(restante // 60) + 1)} min.")
+        self.restante = restante
+
+class LoginOcupado(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Tentativas com falha (em memória, por processo)
+# ----------------------------------------------------------------------------
+class ControleTentativas:
+    def __init__(self, max_falhas: int = 5, janela: float = 900.0, bloqueio: float = 900.0,
+                 max_entradas: int = 10_000):
+        self._max_falhas = max_falhas
+        self._janela = janela
+        self._bloqueio = bloqueio
+        self._max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._dados = OrderedDict()  # chave -> [inicio_janela, falhas, bloqueado_ate]
+        self._recusadas = 0
+
+    def restante(self, chave: str) -> float:
+        # Segundos de bloqueio que faltam (0 = pode tentar)
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None or entrada[2] <= agora:
+                return 0.0
+            self._recusadas += 1
+            return entrada[2] - agora
+
+    def registrar_falha(self, chave: str):
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None or agora - entrada[0] > self._janela:
+                entrada = [agora, 0, 0.0]
+                self._dados[chave] = entrada
+            self._dados.move_to_end(chave)
+            entrada[1] += 1
+            if entrada[1] >= self._max_falhas:
+                entrada[2] = agora + self._bloqueio
+                entrada[0], entrada[1] = agora, 0
+            # Limita a memória sob ataque com muitos usernames diferentes
+            while len(self._dados) > self._max_entradas:
+                self._dados.popitem(last=False)
+
+    def registrar_sucesso(self, chave: str):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def stats(self) -> dict:
+        agora = time.monotonic()
+        with self._lock:
+            return {
+                "rastreados": len(self._dados),
+                "bloqueados": sum(1 for e in self._dados.values() if e[2] > agora),
+                "recusadas": self._recusadas,
+            }
+
+_tentativas = ControleTentativas(LOGIN_MAX_FALHAS, LOGIN_JANELA, LOGIN_BLOQUEIO)
+
+# ----------------------------------------------------------------------------
+# Pool do bcrypt (limitado)
+# ----------------------------------------------------------------------------
+_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="bcrypt")
+_vagas = threading.BoundedSemaphore(LOGIN_WORKERS + LOGIN_FILA)
+
+def _no_pool(fn, *args):
+    if not _vagas.acquire(timeout=1.0):
+        raise LoginOcupado("Muitos logins ao mesmo tempo. Tente novamente em instantes.")
+    try:
+        futuro = _executor.submit(fn, *args)
+    except BaseException:
+        _vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: _vagas.release())
+    try:
+        return futuro.result(timeout=LOGIN_TIMEOUT)
+    except FuturoTimeout:
+        raise LoginOcupado("O login demorou demais. Tente novamente em instantes.") from None
+
+def _em_segundo_plano(fn, *args):
+    # Tarefas que ninguém espera (calibração, rehash) também ocupam vaga da
+    # fila; sem vaga livre ficam para o próximo login em vez de furar o limite
+    if not _vagas.acquire(blocking=False):
+        return
+    try:
+        _executor.submit(fn, *args).add_done_callback(lambda _: _vagas.release())
+    except BaseException:
+        _vagas.release()
+        raise
+
+# ----------------------------------------------------------------------------
+# Custo do bcrypt
+# ----------------------------------------------------------------------------
+_custo = None
+_lock_custo = threading.Lock()
+
+def _calibrar(alvo_ms: float) -> int:
+    # Maior custo cujo hash fica dentro do alvo (cada +1 dobra o tempo)
+    custo = BCRYPT_MIN
+    for rounds in range(BCRYPT_MIN, BCRYPT_MAX + 1):
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b"calibracao", bcrypt.gensalt(rounds=rounds))
+        if (time.perf_counter() - inicio) * 1000 > alvo_ms:
+            break
+        custo = rounds
+    return custo
+
+def _definir_custo() -> int:
+    global _custo
+    with _lock_custo:
+        if _custo is None:
+            _custo = int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else _calibrar(LOGIN_ALVO_MS)
+    return _custo
+
+def custo_bcrypt() -> int:
+    return _custo if _custo is not None else _no_pool(_definir_custo)
+
+def _custo_do_hash(senha_hash: str) -> int | None:
+    # "$2b$12$..." -> 12
+    try:
+        return int(senha_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def _gerar_hash(senha: str, custo: int) -> str:
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(rounds=custo)).decode("utf-8")
+
+def _conferir(senha: str, senha_hash: str) -> bool:
+    return bcrypt.checkpw(senha.encode("utf-8"), senha_hash.encode("utf-8"))
+
+def gerar_hash_senha(senha: str) -> str:
+    custo = custo_bcrypt()
+    return _no_pool(_gerar_hash, senha, custo)
+
+def _rehash(username: str, senha: str, hash_antigo: str, custo: int):
+    try:
+        atualizar_senha_hash(username, hash_antigo, _gerar_hash(senha, custo))
+    except Exception:
+        pass  # fica para o próximo login
+
+# ----------------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------------
+@_medida
+def autenticar_usuario(username, password):
+    # None = usuário/senha inválidos; LoginBloqueado/LoginOcupado = tente mais tarde
+    chave = (username or "").strip().lower()
+    restante = _tentativas.restante(chave)
+    if restante:
+        raise LoginBloqueado(restante)
+
+    row = buscar_credenciais(username)
+    if not row or not row["is_active"] or not _no_pool(_conferir, password, row["senha_hash"]):
+        _tentativas.registrar_falha(chave)
+        return None
+    _tentativas.registrar_sucesso(chave)
+
+    if _custo is None:
+        # Calibra em segundo plano; o rehash fica para o próximo login
+        _em_segundo_plano(_definir_custo)
+    elif (_custo_do_hash(row["senha_hash"]) or 0) < _custo:
+        # Só sobe o custo (servidores com CPUs diferentes não ficam regravando
+        # o hash um do outro) e fora do caminho do login: o usuário não espera
+        _em_segundo_plano(_rehash, row["username"], password, row["senha_hash"], _custo)
+    return {"username": row["username"], "role": row["role"]}
+
+def criar_usuario(username, senha, role):
+    inserir_usuario(username, gerar_hash_senha(senha), role)
+
+def login_stats() -> dict:
+    return {**_tentativas.stats(), "workers": LOGIN_WORKERS, "custo_bcrypt": _custo}
+
+# ----------------------------------------------------------------------------
+# Provisionamento em lote
+# ----------------------------------------------------------------------------
+# O bcrypt solta o GIL, então threads já ocupam todos os núcleos (sem o custo de
+# subir processos e serializar argumentos). O pool é separado do do login: um
+# lote de centenas de usuários não enche a fila de quem está tentando entrar.
+_executor_lote = ThreadPoolExecutor(max_workers=LOTE_WORKERS, thread_name_prefix="bcrypt-lote")
+
+def ler_lista_usuarios(texto: str) -> tuple[list[tuple], list[tuple]]:
+    # Uma linha por usuário: "username;senha;role" (também com vírgula ou TAB;
+    # cabeçalho opcional). Senha vazia = gerar uma; role vazia = user.
+    # Devolve (válidas [(username, senha | None, role)], erros [(linha, mensagem)]).
+    texto = texto.replace("\r\n", "\n")
+    primeira = next((l for l in texto.split("\n") if l.strip()), "")
+    sep = max(";,\t", key=primeira.count) if any(c in primeira for c in ";,\t") else ";"
+    validas, erros, vistos = [], [], set()
+    for n, campos in enumerate(csv.reader(io.StringIO(texto), delimiter=sep), 1):
+        campos = [c.strip() for c in campos] + ["", "", ""]
+        username, senha, role = campos[0], campos[1], campos[2].lower() or "user"
+        if not username or (n == 1 and username.lower() in ("username", "usuario", "usuário")):
+            continue
+        if len(username) > 100 or any(c.isspace() for c in username):
+            erros.append((n, f"username inválido: {username!r}"))
+        elif role not in ROLES:
+            erros.append((n, f"role inválida: {role!r} (use {', '.join(ROLES)})"))
+        elif username.lower() in vistos:
+            erros.append((n, f"username repetido na lista: {username}"))
+        else:
+            vistos.add(username.lower())
+            validas.append((username, senha or None, role))
+    return validas, erros
+
+@_medida
+def provisionar_usuarios(linhas: list[tuple], atualizar: bool = False, progresso=None) -> dict:
+    # linhas = saída de ler_lista_usuarios. Sem `atualizar`, quem já existe é
+    # pulado antes do hash (não gasta CPU à toa). progresso(feitos, total) é
+    # chamado na thread de quem chamou, a cada hash pronto.
+    existentes = set() if atualizar else usernames_existentes([u for u, _, _ in linhas])
+    novos = [(u, senha or secrets.token_urlsafe(9), role, not senha)
+             for u, senha, role in linhas if u not in existentes]
+    custo = custo_bcrypt()
+    futuros = {_executor_lote.submit(_gerar_hash, senha, custo): i for i, (_, senha, _, _) in enumerate(novos)}
+    hashes = [None] * len(novos)
+    try:
+        for feitos, futuro in enumerate(as_completed(futuros), 1):
+            hashes[futuros[futuro]] = futuro.result()
+            if progresso:
+                progresso(feitos, len(novos))
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+    gravados = upsert_usuarios(
+        [(u, h, role, gerada) for (u, _, role, gerada), h in zip(novos, hashes)], atualizar
+    )
+    inseridos = sum(gravados.values())
+    return {
+        "inseridos": inseridos,
+        "atualizados": len(gravados) - inseridos,
+        "ignorados": len(linhas) - len(gravados),
+        # Senhas geradas de quem foi gravado: só aparecem aqui, para repassar
+        "senhas_geradas": [(u, senha) for u, senha, _, gerada in novos if gerada and u in gravados],
+    }
@@ -0,0 +1,390 @@
+# bench.py — Yassaka | Benchmarks da camada de dados e dos reruns das páginas
+#
+# Roda contra um Postgres LOCAL descartável (nunca o Neon de produção): semeia
+# 10k / 1M / 10M linhas por tabela, mede latência (p50/p90/p95/p99) e vazão das
+# funções de db.py/autenticacao.py e o tempo de rerun completo das páginas via
+# AppTest, e grava tudo em JSON para comparar entre commits.
+#
+# Uso:
+#   python benchmarks/bench.py semear   --dsn postgresql://localhost/yassaka_bench --tamanho 1m
+#   python benchmarks/bench.py rodar    --dsn postgresql://localhost/yassaka_bench --tamanho 1m
+#   python benchmarks/bench.py comparar benchmarks/resultados/abc123_1m.json benchmarks/resultados/def456_1m.json
+#
+# `rodar` aceita --casos (filtro por substring), --iteracoes, --threads/--duracao
+# (vazão concorrente) e --sem-paginas (pula o AppTest).
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from urllib.parse import urlparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+TAMANHOS = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+USUARIOS = 200
+CLIENTES = 5_000
+ANOS = 3
+SENHA = "bench-senha"
+BCRYPT_ROUNDS = 10
+LOTE_SEMEADURA = 1_000_000
+
+# ----------------------------------------------------------------------------
+# Ambiente: db.py lê a configuração no import, então o DSN vai para o ambiente
+# antes de importar os módulos do app (por isso os imports dentro das funções).
+# ----------------------------------------------------------------------------
+def _configurar(dsn: str, threads: int = 1):
+    host = urlparse(dsn).hostname or ""
+    if "neon.tech" in host:
+        raise SystemExit("Recusado: os benchmarks apagam e semeiam dados; use um Postgres local.")
+    os.environ["NEON_URL"] = dsn
+    os.environ.pop("NEON_READ_URL", None)
+    os.environ["DB_POOL_MAX"] = str(max(10, threads + 2))
+    os.environ["BCRYPT_ROUNDS"] = str(BCRYPT_ROUNDS)
+    os.environ["FILA_ARQUIVO"] = os.path.join(RESULTADOS, ".fila_bench.sqlite3")
+    # Lockout não pode disparar no meio da medição
+    os.environ["LOGIN_MAX_FALHAS"] = str(10**9)
+    os.makedirs(RESULTADOS, exist_ok=True)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+def _usuarios() -> list[str]:
+    return [f"user{i:04d}" for i in range(1, USUARIOS + 1)]
+
+# ----------------------------------------------------------------------------
+# Semeadura (tudo no servidor, com generate_series)
+# ----------------------------------------------------------------------------
+_SQL_PROPOSTAS = """
+    INSERT INTO app.propostas (cliente, cliente_id, produto, valor, turmas, head_responsavel, qmf, criado_em)
+    SELECT 'Cliente ' || c, c, 'Produto ' || (i %% 40),
+           round((random() * 50000)::numeric, 2), 1 + i %% 10,
+           'user' || lpad((1 + i %% %(usuarios)s)::text, 4, '0'),
+           (ARRAY['Q', 'M', 'F'])[1 + i %% 3],
+           now() - (%(n)s - i) * (%(anos)s * interval '365 days' / %(n)s)
+    FROM generate_series(%(de)s, %(ate)s) i,
+         LATERAL (SELECT 1 + (i * 7919) %% %(clientes)s AS c) x;
+"""
+
+_SQL_ATIVIDADES = """
+    INSERT INTO app.{tabela} (owner_username, data, cliente, cliente_id, responsavel, criado_em)
+    SELECT dono, t::date, 'Cliente ' || c, c, dono, t
+    FROM generate_series(%(de)s, %(ate)s) i,
+         LATERAL (SELECT 1 + (i * 104729) %% %(clientes)s AS c,
+                         'user' || lpad((1 + i %% %(usuarios)s)::text, 4, '0') AS dono,
+                         now() - (%(n)s - i) * (%(anos)s * interval '365 days' / %(n)s) AS t) x;
+"""
+
+_SQL_ATESTADOS = """
+    INSERT INTO app.atestados_educadores
+        (owner_username, mes, cliente, cliente_id, projeto_finalizado, atestado_conquistado, criado_em)
+    SELECT dono, date_trunc('month', t)::date, 'Cliente ' || c, c, 'Projeto ' || (i %% 100), 'Atestado', t
+    FROM generate_series(%(de)s, %(ate)s) i,
+         LATERAL (SELECT 1 + (i * 7919) %% %(clientes)s AS c,
+                         'user' || lpad((1 + i %% %(usuarios)s)::text, 4, '0') AS dono,
+                         now() - (%(n)s - i) * (%(anos)s * interval '365 days' / %(n)s) AS t) x;
+"""
+
+def semear(dsn: str, tamanho: str):
+    _configurar(dsn)
+    import bcrypt
+    import psycopg2.extras
+
+    from migracoes import aplicar_migracoes
+
+    n = TAMANHOS[tamanho]
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("DROP SCHEMA IF EXISTS app CASCADE; DROP SCHEMA IF EXISTS arquivo CASCADE;")
+        aplicar_migracoes(conn)
+        with conn, conn.cursor() as cur:
+            # Partições dos meses semeados (a migração só cria do mês atual em diante)
+            cur.execute(
+                """
+                SELECT app.criar_particao_mensal(t, m::date)
+                FROM unnest(ARRAY['contatos_efetivos', 'reunioes_efetivadas']) t,
+                     generate_series(date_trunc('month', now() - %s * interval '365 days'),
+                                     date_trunc('month', now()), interval '1 month') m;
+                """,
+                (ANOS,),
+            )
+            senha_hash = bcrypt.hashpw(SENHA.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO app.usuarios (username, senha_hash, role) VALUES %s;",
+                [(u, senha_hash, "user") for u in _usuarios()] + [("admin", senha_hash, "admin")],
+            )
+            cur.execute(
+                """
+                INSERT INTO app.clientes (chave, nome)
+                SELECT 'cliente ' || i, 'Cliente ' || i FROM generate_series(1, %s) i;
+                """,
+                (CLIENTES,),
+            )
+
+        etapas = [
+            ("propostas", _SQL_PROPOSTAS, n),
+            ("contatos_efetivos", _SQL_ATIVIDADES.format(tabela="contatos_efetivos"), n),
+            ("reunioes_efetivadas", _SQL_ATIVIDADES.format(tabela="reunioes_efetivadas"), n),
+            ("atestados_educadores", _SQL_ATESTADOS, max(n // 10, 1)),
+        ]
+        for tabela, sql, total in etapas:
+            # A carga inicial não é "mudança": sem os triggers do change_log (migração 10)
+            with conn, conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE app.{tabela} DISABLE TRIGGER USER;")
+            for de in range(1, total + 1, LOTE_SEMEADURA):
+                ate = min(de + LOTE_SEMEADURA - 1, total)
+                inicio = time.perf_counter()
+                with conn, conn.cursor() as cur:
+                    cur.execute(sql, {"de": de, "ate": ate, "n": total, "anos": ANOS,
+                                      "usuarios": USUARIOS, "clientes": CLIENTES})
+                print(f"{tabela}: {ate}/{total} ({time.perf_counter() - inicio:.1f}s)", flush=True)
+            with conn, conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE app.{tabela} ENABLE TRIGGER USER;")
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE;")
+    finally:
+        conn.close()
+
+# ----------------------------------------------------------------------------
+# Medição
+# ----------------------------------------------------------------------------
+def _resumo(tempos: list[float], total_s: float, erros: int) -> dict:
+    ms = sorted(t * 1000 for t in tempos)
+    if len(ms) >= 2:
+        q = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p90, p95, p99 = q[49], q[89], q[94], q[98]
+    else:
+        p50 = p90 = p95 = p99 = ms[0] if ms else None
+    return {
+        "n": len(ms),
+        "erros": erros,
+        "media_ms": round(statistics.fmean(ms), 3) if ms else None,
+        "p50_ms": round(p50, 3) if ms else None,
+        "p90_ms": round(p90, 3) if ms else None,
+        "p95_ms": round(p95, 3) if ms else None,
+        "p99_ms": round(p99, 3) if ms else None,
+        "max_ms": round(ms[-1], 3) if ms else None,
+        "ops_s": round(len(ms) / total_s, 2) if total_s else None,
+    }
+
+def medir(fn, iteracoes: int, aquecimento: int = 5) -> dict:
+    for _ in range(aquecimento):
+        fn()
+    tempos, erros = [], 0
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            erros += 1
+            continue
+        tempos.append(time.perf_counter() - t0)
+    return _resumo(tempos, time.perf_counter() - inicio, erros)
+
+def medir_concorrente(fn, threads: int, duracao: float) -> dict:
+    # Vazão com `threads` chamadas simultâneas durante `duracao` segundos
+    limite = time.perf_counter() + duracao
+
+    def trabalhador():
+        tempos, erros = [], 0
+        while time.perf_counter() < limite:
+            t0 = time.perf_counter()
+            try:
+                fn()
+            except Exception:
+                erros += 1
+                continue
+            tempos.append(time.perf_counter() - t0)
+        return tempos, erros
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        partes = list(ex.map(lambda _: trabalhador(), range(threads)))
+    total = time.perf_counter() - inicio
+    return _resumo([t for tempos, _ in partes for t in tempos], total, sum(e for _, e in partes))
+
+def _casos(rnd: random.Random) -> dict:
+    import autenticacao
+    import db
+
+    usuarios = _usuarios()
+
+    def u():
+        return rnd.choice(usuarios)
+
+    hoje = date.today()
+    # .sem_cache = custo de um miss (o que o banco faz); as variantes [cache]
+    # medem o acerto no cache de leituras do processo
+    return {
+        "listar_propostas[admin]": lambda: db.listar_propostas.sem_cache("admin", "admin", limit=50),
+        "listar_propostas[user]": lambda: db.listar_propostas.sem_cache(u(), "user", limit=50),
+        "listar_propostas[user,cache]": lambda: db.listar_propostas(u(), "user", limit=50),
+        "listar_contatos_visiveis[admin]": lambda: db.listar_contatos_visiveis.sem_cache("admin", "admin", limit=20),
+        "listar_contatos_visiveis[user]": lambda: db.listar_contatos_visiveis.sem_cache(u(), "user", limit=20),
+        "listar_reunioes_visiveis[admin]": lambda: db.listar_reunioes_visiveis.sem_cache("admin", "admin", limit=20),
+        "listar_reunioes_visiveis[user]": lambda: db.listar_reunioes_visiveis.sem_cache(u(), "user", limit=20),
+        "carregar_pagina_propostas[user]": lambda: (db.limpar_cache(), db.carregar_pagina_propostas(u(), "user")),
+        "registrar_proposta": lambda: db.registrar_proposta(
+            f"Cliente {rnd.randint(1, CLIENTES)}", "Produto bench", "1234.56", 2, u(), "M"
+        ),
+        "inserir_contato": lambda: db.inserir_contato(u(), hoje, f"Cliente {rnd.randint(1, CLIENTES)}", "bench"),
+        "inserir_reuniao": lambda: db.inserir_reuniao(u(), hoje, f"Cliente {rnd.randint(1, CLIENTES)}", "bench"),
+        "inserir_atestado": lambda: db.inserir_atestado(
+            u(), hoje.replace(day=1), f"Cliente {rnd.randint(1, CLIENTES)}", "Projeto bench", "Atestado bench"
+        ),
+        "autenticar_usuario": lambda: autenticacao.autenticar_usuario(u(), SENHA),
+    }
+
+def medir_paginas(iteracoes: int) -> dict:
+    # Rerun completo do app.py (mesmo processo: pool e cache de db.py são os
+    # mesmos entre reruns, como no servidor). [frio] limpa o cache antes de cada rerun.
+    import db
+    from streamlit.testing.v1 import AppTest
+
+    resultados = {}
+    for pagina, role in (("Propostas", "user"), ("Propostas", "admin"), ("Educadores", "admin")):
+        at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+        at.session_state["autenticado"] = True
+        at.session_state["usuario"] = "user0001" if role == "user" else "admin"
+        at.session_state["role"] = role
+        at.run()
+        if pagina != "Propostas":
+            at.sidebar.radio[0].set_value(pagina).run()
+        if at.exception:
+            resultados[f"pagina:{pagina}[{role}]"] = {"erro": str(at.exception[0].message)}
+            continue
+        for variante, antes in (("quente", None), ("frio", db.limpar_cache)):
+            def rerun():
+                if antes:
+                    antes()
+                at.run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+            resultados[f"pagina:{pagina}[{role},{variante}]"] = medir(rerun, iteracoes, aquecimento=1)
+    return resultados
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "desconhecido"
+
+def rodar(args) -> str:
+    _configurar(args.dsn, args.threads)
+    import db
+
+    rnd = random.Random(args.semente)
+    with db.conexao_leitura() as cur:
+        cur.execute("SELECT version();")
+        versao = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT (SELECT count(*) FROM app.propostas), (SELECT count(*) FROM app.contatos_efetivos),
+                   (SELECT count(*) FROM app.reunioes_efetivadas), (SELECT count(*) FROM app.atestados_educadores);
+            """
+        )
+        linhas = dict(zip(["propostas", "contatos", "reunioes", "atestados"], cur.fetchone()))
+
+    resultados = {}
+    for nome, fn in _casos(rnd).items():
+        if args.casos and not any(c in nome for c in args.casos):
+            continue
+        resultados[nome] = medir(fn, args.iteracoes)
+        if args.threads > 1:
+            resultados[f"{nome}@{args.threads}t"] = medir_concorrente(fn, args.threads, args.duracao)
+        print(f"{nome:40} p50={resultados[nome]['p50_ms']}ms p95={resultados[nome]['p95_ms']}ms", flush=True)
+    if not args.sem_paginas and (not args.casos or any("pagina" in c for c in args.casos)):
+        for nome, r in medir_paginas(max(args.iteracoes // 10, 5)).items():
+            resultados[nome] = r
+            print(f"{nome:40} p50={r.get('p50_ms')}ms p95={r.get('p95_ms')}ms", flush=True)
+
+    commit = _commit()
+    saida = args.saida or os.path.join(RESULTADOS, f"{commit}_{args.tamanho}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "tamanho": args.tamanho,
+                "linhas": linhas,
+                "postgres": versao,
+                "iteracoes": args.iteracoes,
+                "threads": args.threads,
+                "resultados": resultados,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    print(f"resultados: {saida}")
+    return saida
+
+# ----------------------------------------------------------------------------
+# Comparação entre dois JSON
+# ----------------------------------------------------------------------------
+def comparar(antes: str, depois: str, limite: float, metrica: str = "p95_ms") -> int:
+    with open(antes, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(depois, encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"{a['commit']} ({a['tamanho']}) -> {b['commit']} ({b['tamanho']}) — {metrica}")
+    regressoes = 0
+    for nome in sorted(set(a["resultados"]) & set(b["resultados"])):
+        va, vb = a["resultados"][nome].get(metrica), b["resultados"][nome].get(metrica)
+        if not va or vb is None:
+            continue
+        variacao = (vb - va) / va * 100
+        marca = ""
+        if variacao > limite:
+            marca = "  <-- regressão"
+            regressoes += 1
+        print(f"{nome:44} {va:10.2f} -> {vb:10.2f}  {variacao:+7.1f}%{marca}")
+    return 1 if regressoes else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do Yassaka (Postgres local).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_semear = sub.add_parser("semear", help="recria o schema app e semeia os dados")
+    p_semear.add_argument("--dsn", default=os.getenv("BENCH_DSN"), required=not os.getenv("BENCH_DSN"))
+    p_semear.add_argument("--tamanho", choices=sorted(TAMANHOS), default="10k")
+
+    p_rodar = sub.add_parser("rodar", help="mede e grava o JSON de resultados")
+    p_rodar.add_argument("--dsn", default=os.getenv("BENCH_DSN"), required=not os.getenv("BENCH_DSN"))
+    p_rodar.add_argument("--tamanho", choices=sorted(TAMANHOS), default="10k", help="rótulo do dataset semeado")
+    p_rodar.add_argument("--iteracoes", type=int, default=200)
+    p_rodar.add_argument("--threads", type=int, default=1, help=">1 mede também a vazão concorrente")
+    p_rodar.add_argument("--duracao", type=float, default=10.0, help="segundos de cada medição concorrente")
+    p_rodar.add_argument("--casos", nargs="*", help="só os casos que contêm estes trechos (ex.: listar pagina)")
+    p_rodar.add_argument("--sem-paginas", action="store_true", help="não mede os reruns via AppTest")
+    p_rodar.add_argument("--semente", type=int, default=42)
+    p_rodar.add_argument("--saida", help="arquivo JSON (padrão: benchmarks/resultados/<commit>_<tamanho>.json)")
+
+    p_comparar = sub.add_parser("comparar", help="compara dois JSON de resultados")
+    p_comparar.add_argument("antes")
+    p_comparar.add_argument("depois")
+    p_comparar.add_argument("--limite", type=float, default=20.0, help="%% de piora que conta como regressão")
+    p_comparar.add_argument("--metrica", default="p95_ms")
+
+    args = parser.parse_args(argv)
+    if args.comando == "semear":
+        semear(args.dsn, args.tamanho)
+    elif args.comando == "rodar":
+        rodar(args)
+    else:
+        sys.exit(comparar(args.antes, args.depois, args.limite, args.metrica))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# cache.py — Yassaka | Cache de leituras em memória (LRU + TTL), compartilhado entre sessões
+import threading
+import time
+from collections import OrderedDict
+
+class CacheLeituras:
+    # Cada entrada guarda, além do valor, as tabelas de onde ele veio e o "dono"
+    # dos dados (None = visão de admin, enxerga todos os donos). Uma escrita em
+    # (tabela, dono) só mexe nas entradas que podem conter aquela linha.
+    #
+    # Gerações: cada escrita incrementa o contador de (tabela, dono). Quem vai
+    # ler do banco pega geracao() antes da consulta e passa no put(): se uma
+    # escrita que afeta a leitura aconteceu no meio, o valor (talvez de antes
+    # da escrita) não é guardado — senão ficaria no cache pelo TTL inteiro.
+    def __init__(self, maxsize: int = 512, ttl: float = 60.0):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._dados = OrderedDict()  # chave -> [expira_em, valor, tabelas, dono, meta]
+        self._geracoes = {}  # (tabela, dono) -> nº de escritas; dono None = escrita de qualquer dono
+        self._escritas = {}  # tabela -> nº de escritas de todos os donos (leitura de admin)
+        self._epoca = 0      # limpar()
+        self._hits = 0
+        self._misses = 0
+        self._invalidacoes = 0
+        self._atualizacoes = 0
+        self._descartes = 0
+
+    def get(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None or entrada[0] < agora:
+                if entrada is not None:
+                    del self._dados[chave]
+                self._misses += 1
+                return False, None
+            self._dados.move_to_end(chave)
+            self._hits += 1
+            return True, entrada[1]
+
+    def _geracao(self, tabelas: tuple, dono: str | None) -> tuple:
+        if dono is None:
+            return (self._epoca, *(self._escritas.get(t, 0) for t in tabelas))
+        return (self._epoca, *((self._geracoes.get((t, dono), 0), self._geracoes.get((t, None), 0))
+                               for t in tabelas))
+
+    def geracao(self, tabelas: tuple, dono: str | None) -> tuple:
+        with self._lock:
+            return self._geracao(tabelas, dono)
+
+    def _escrita(self, tabela: str, dono: str | None):
+        self._geracoes[(tabela, dono)] = self._geracoes.get((tabela, dono), 0) + 1
+        self._escritas[tabela] = self._escritas.get(tabela, 0) + 1
+
+    def put(self, chave, valor, tabelas: tuple, dono: str | None,
+            meta: dict | None = None, ttl: float | None = None, geracao: tuple | None = None):
+        expira = time.monotonic() + (self._ttl if ttl is None else ttl)
+        with self._lock:
+            if geracao is not None and geracao != self._geracao(tabelas, dono):
+                self._descartes += 1
+                return
+            self._dados[chave] = [expira, valor, tabelas, dono, meta or {}]
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self._maxsize:
+                self._dados.popitem(last=False)
+
+    def _afetadas(self, tabela: str, dono: str | None):
+        for chave, (_, _, tabelas, dono_entrada, meta) in self._dados.items():
+            if tabela in tabelas and (dono is None or dono_entrada is None or dono_entrada == dono):
+                yield chave, meta
+
+    def invalidar(self, tabela: str, dono: str | None = None):
+        with self._lock:
+            self._escrita(tabela, dono)
+            chaves = [chave for chave, _ in self._afetadas(tabela, dono)]
+            for chave in chaves:
+                del self._dados[chave]
+            self._invalidacoes += len(chaves)
+
+    def registrar_insercao(self, tabela: str, dono: str, linha: tuple):
+        # Write-through: listas "primeira página" recebem a linha nova no topo;
+        # o resto (filtros, contagens, páginas seguintes) é invalidado.
+        with self._lock:
+            self._escrita(tabela, dono)
+            for chave, meta in list(self._afetadas(tabela, dono)):
+                entrada = self._dados[chave]
+                limit = meta.get("prepend_limit")
+                if limit is not None:
+                    entrada[1] = ([linha] + list(entrada[1]))[:limit]
+                    self._atualizacoes += 1
+                else:
+                    del self._dados[chave]
+                    self._invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self._epoca += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._dados),
+                "max": self._maxsize,
+                "ttl_s": self._ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidacoes": self._invalidacoes,
+                "atualizacoes": self._atualizacoes,
+                "descartes": self._descartes,
+            }
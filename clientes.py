@@ -0,0 +1,72 @@
+# clientes.py — Yassaka | Backfill de app.clientes / cliente_id nas linhas antigas
+#
+# Roda uma vez depois da migração 6 (e de novo, sem efeito colateral, se sobrar
+# alguma linha com cliente_id NULL). Trabalha em lotes de nomes distintos, um
+# commit por lote, para não segurar lock nas tabelas por muito tempo.
+#
+# Uso (CLI):
+#   python clientes.py
+import argparse
+
+import psycopg2.extras
+
+from db import TABELAS_CLIENTE, chave_cliente, get_connection
+
+TAM_LOTE = 1000
+
+def _backfill_tabela(conn, tabela: str, lote: int) -> int:
+    atualizadas = 0
+    while True:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                f"SELECT DISTINCT cliente FROM app.{tabela} WHERE cliente_id IS NULL LIMIT %s;",
+                (lote,),
+            )
+            nomes = [n for (n,) in cur.fetchall()]
+            if not nomes:
+                return atualizadas
+            # Uma linha por chave no upsert (o DO UPDATE não aceita a mesma chave duas vezes)
+            por_chave = {}
+            for nome in nomes:
+                por_chave.setdefault(chave_cliente(nome), nome.strip())
+            ids = dict(
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO app.clientes (chave, nome) VALUES %s
+                    ON CONFLICT (chave) DO UPDATE SET chave = EXCLUDED.chave
+                    RETURNING chave, id;
+                    """,
+                    list(por_chave.items()),
+                    fetch=True,
+                )
+            )
+            psycopg2.extras.execute_values(
+                cur,
+                f"""
+                UPDATE app.{tabela} t SET cliente_id = v.cliente_id
+                FROM (VALUES %s) AS v (cliente, cliente_id)
+                WHERE t.cliente = v.cliente AND t.cliente_id IS NULL;
+                """,
+                [(nome, ids[chave_cliente(nome)]) for nome in nomes],
+                page_size=lote,
+            )
+            atualizadas += cur.rowcount
+
+def backfill(lote: int = TAM_LOTE) -> dict:
+    conn = get_connection()
+    try:
+        resultado = {tabela: _backfill_tabela(conn, tabela, lote) for tabela in TABELAS_CLIENTE}
+    finally:
+        conn.close()
+    return resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preenche app.clientes e cliente_id nas linhas antigas.")
+    parser.add_argument("--lote", type=int, default=TAM_LOTE, help="nomes distintos por transação")
+    args = parser.parse_args(argv)
+    for tabela, n in backfill(args.lote).items():
+        print(f"{tabela}: {n} linhas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# exportacao.py — Yassaka | Exportação completa das tabelas em CSV/Parquet, em streaming
+#
+# CSV sai direto do Postgres via COPY ... TO STDOUT; Parquet sai de um cursor
+# nomeado (server-side) lido em lotes fixos. Em ambos os casos a memória usada
+# não depende do tamanho da tabela.
+#
+# Uso (CLI):
+#   python exportacao.py propostas --formato csv --saida propostas.csv.gz
+#   python exportacao.py reunioes --formato parquet --saida reunioes.parquet
+import argparse
+import gzip
+import sys
+import uuid
+
+from db import get_connection
+
+TABELAS_EXPORTAVEIS = {
+    "propostas": "app.propostas",
+    "reunioes": "app.reunioes_efetivadas",
+    "contatos": "app.contatos_efetivos",
+    "atestados": "app.atestados_educadores",
+}
+
+TAM_LOTE = 10_000
+
+def _consulta(chave: str) -> str:
+    return f"SELECT * FROM {TABELAS_EXPORTAVEIS[chave]} ORDER BY id"
+
+# ----------------------------------------------------------------------------
+# CSV (COPY TO STDOUT)
+# ----------------------------------------------------------------------------
+def exportar_csv(chave: str, destino, conn=None):
+    # `destino`: arquivo binário aberto para escrita (o psycopg2 escreve bloco a bloco)
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.copy_expert(
+                f"COPY ({_consulta(chave)}) TO STDOUT WITH (FORMAT csv, HEADER, ENCODING 'UTF8')",
+                destino,
+            )
+    finally:
+        if proprio:
+            conn.close()
+
+# ----------------------------------------------------------------------------
+# Parquet (cursor nomeado + ParquetWriter)
+# ----------------------------------------------------------------------------
+def _schema_arrow(pa, description):
+    # Tipos vêm do OID do Postgres, não da inferência sobre o 1º lote (que
+    # erraria colunas inteiramente nulas no começo da tabela).
+    tipos = {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp("us"),
+        1184: pa.timestamp("us", tz="UTC"),
+    }
+    campos = []
+    for col in description:
+        if col.type_code == 1700:  # numeric
+            # numeric sem typmod (o driver devolve 65535) não tem escala fixa:
+            # vai como texto para não truncar as casas decimais
+            if col.precision is not None and col.precision <= 38:
+                tipo = pa.decimal128(col.precision, col.scale)
+            elif col.precision is not None and col.precision <= 76:
+                tipo = pa.decimal256(col.precision, col.scale)
+            else:
+                tipo = pa.string()
+        else:
+            tipo = tipos.get(col.type_code, pa.string())
+        campos.append(pa.field(col.name, tipo))
+    return pa.schema(campos)
+
+def escrever_parquet(consulta: str, destino, conn, lote: int = TAM_LOTE):
+    # Qualquer SELECT -> Parquet (também usado no arquivamento de partições antigas)
+    import pyarrow as pa  # import tardio: só a exportação Parquet precisa
+    import pyarrow.parquet as pq
+
+    with conn, conn.cursor(name=f"exp_{uuid.uuid4().hex[:12]}") as cur:
+        cur.itersize = lote
+        cur.execute(consulta)
+        linhas = cur.fetchmany(lote)
+        schema = _schema_arrow(pa, cur.description)
+        nomes = schema.names
+        como_texto = {col.name for col in cur.description
+                      if col.type_code == 1700 and pa.types.is_string(schema.field(col.name).type)}
+        with pq.ParquetWriter(destino, schema, compression="zstd") as writer:
+            while linhas:
+                colunas = list(zip(*linhas))
+                colunas = [[None if x is None else str(x) for x in v] if n in como_texto else v
+                           for n, v in zip(nomes, colunas)]
+                writer.write_table(
+                    pa.table({n: pa.array(v, type=schema.field(n).type) for n, v in zip(nomes, colunas)},
+                             schema=schema)
+                )
+                linhas = cur.fetchmany(lote)
+
+def exportar_parquet(chave: str, destino, conn=None, lote: int = TAM_LOTE):
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        escrever_parquet(_consulta(chave) + ";", destino, conn, lote)
+    finally:
+        if proprio:
+            conn.close()
+
+def exportar(chave: str, formato: str, destino, conn=None):
+    if chave not in TABELAS_EXPORTAVEIS:
+        raise ValueError(f"Tabela desconhecida: {chave}")
+    if formato == "csv":
+        exportar_csv(chave, destino, conn)
+    elif formato == "parquet":
+        exportar_parquet(chave, destino, conn)
+    else:
+        raise ValueError(f"Formato inválido: {formato} (use csv ou parquet)")
+
+# ----------------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta tabelas do Yassaka (CSV/Parquet) em streaming.")
+    parser.add_argument("tabela", choices=sorted(TABELAS_EXPORTAVEIS))
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--saida", default="-", help="arquivo de saída ('-' = stdout, só CSV; .gz comprime)")
+    args = parser.parse_args(argv)
+
+    if args.saida == "-":
+        if args.formato != "csv":
+            parser.error("Parquet precisa de --saida (arquivo).")
+        exportar(args.tabela, "csv", sys.stdout.buffer)
+    elif args.saida.endswith(".gz"):
+        if args.formato != "csv":
+            parser.error(".gz só vale para CSV (o Parquet já sai comprimido).")
+        with gzip.open(args.saida, "wb") as destino:
+            exportar(args.tabela, "csv", destino)
+    else:
+        with open(args.saida, "wb") as destino:
+            exportar(args.tabela, args.formato, destino)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# fila.py — Yassaka | Fila local durável (SQLite) para as escritas dos formulários
+#
+# O Neon suspende a compute ociosa: a 1ª escrita depois de um tempo parado pode
+# demorar segundos ou falhar. Os formulários gravam aqui (disco local, fsync) e
+# voltam na hora; uma thread por processo drena a fila para o Postgres em lotes
+# (db.aplicar_escritas), com backoff exponencial entre tentativas. Cada item tem
+# uma chave de idempotência (UUID) gravada junto com a linha no Postgres, então
+# reenviar depois de uma falha "no meio do caminho" não duplica nada.
+#
+# Erros do próprio dado (valor inválido, violação de constraint) não são
+# repetidos: o item fica marcado com o erro para o usuário/admin ver.
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from db import _get_setting, aplicar_escritas, limpar_escritas_aplicadas
+
+FILA_ARQUIVO = _get_setting(
+    "FILA_ARQUIVO", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fila_escritas.sqlite3")
+)
+TAM_LOTE = 50
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+# Enquanto um processo envia um lote, os outros não pegam os mesmos itens
+LEASE = 60.0
+# Quanto o formulário espera a sincronização antes de dizer "pendente"
+ESPERA_FORMULARIO = float(_get_setting("FILA_ESPERA", 2.0))
+LIMPEZA_INTERVALO = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fila (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  chave       TEXT NOT NULL UNIQUE,
+  operacao    TEXT NOT NULL,
+  dados       TEXT NOT NULL,
+  dono        TEXT,
+  criado_em   REAL NOT NULL,
+  tentativas  INTEGER NOT NULL DEFAULT 0,
+  proxima_em  REAL NOT NULL,
+  erro        TEXT,
+  falhou      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS fila_proxima_idx ON fila (falhou, proxima_em);
+CREATE INDEX IF NOT EXISTS fila_dono_idx ON fila (dono, falhou);
+"""
+
+# ----------------------------------------------------------------------------
+# Serialização dos argumentos (datas e Decimal viram JSON e voltam)
+# ----------------------------------------------------------------------------
+def _codificar(valor):
+    if isinstance(valor, datetime):
+        return {"__datetime__": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"__date__": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {"__decimal__": str(valor)}
+    raise TypeError(f"Tipo não serializável na fila: {type(valor).__name__}")
+
+def _decodificar(obj: dict):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    return obj
+
+# ----------------------------------------------------------------------------
+# SQLite
+# ----------------------------------------------------------------------------
+_iniciada = False
+_lock_inicio = threading.Lock()
+
+def _conectar() -> sqlite3.Connection:
+    # Uma conexão por operação: o sqlite3 não compartilha conexão entre threads
+    conn = sqlite3.connect(FILA_ARQUIVO, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA synchronous=FULL;")
+    return conn
+
+def _iniciar():
+    global _iniciada
+    if _iniciada:
+        return
+    with _lock_inicio:
+        if _iniciada:
+            return
+        conn = _conectar()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        threading.Thread(target=_loop_envio, name="fila-escritas", daemon=True).start()
+        _iniciada = True
+
+def enfileirar(operacao: str, dono: str, **kwargs) -> str:
+    _iniciar()
+    chave = str(uuid.uuid4())
+    agora = time.time()
+    conn = _conectar()
+    try:
+        conn.execute(
+            "INSERT INTO fila (chave, operacao, dados, dono, criado_em, proxima_em) VALUES (?, ?, ?, ?, ?, ?);",
+            (chave, operacao, json.dumps(kwargs, default=_codificar), dono, agora, agora),
+        )
+    finally:
+        conn.close()
+    _acordar.set()
+    return chave
+
+def _reservar_lote() -> list[tuple]:
+    agora = time.time()
+    conn = _conectar()
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        linhas = conn.execute(
+            """
+            SELECT id, chave, operacao, dados, tentativas FROM fila
+            WHERE falhou = 0 AND proxima_em <= ?
+            ORDER BY id
+            LIMIT ?;
+            """,
+            (agora, TAM_LOTE),
+        ).fetchall()
+        if linhas:
+            conn.executemany(
+                "UPDATE fila SET proxima_em = ? WHERE id = ?;", [(agora + LEASE, i) for i, *_ in linhas]
+            )
+        conn.execute("COMMIT;")
+        return linhas
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    finally:
+        conn.close()
+
+def _concluir(aplicadas: list[str], falhas: dict):
+    conn = _conectar()
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        conn.executemany("DELETE FROM fila WHERE chave = ?;", [(c,) for c in aplicadas])
+        conn.executemany(
+            "UPDATE fila SET falhou = 1, erro = ? WHERE chave = ?;", [(e, c) for c, e in falhas.items()]
+        )
+        conn.execute("COMMIT;")
+    finally:
+        conn.close()
+
+def _adiar(lote: list[tuple], erro: str):
+    # Backoff exponencial com jitter, por item (tentativas acumuladas)
+    agora = time.time()
+    conn = _conectar()
+    try:
+        conn.executemany(
+            "UPDATE fila SET tentativas = ?, proxima_em = ?, erro = ? WHERE id = ?;",
+            [
+                (t + 1, agora + random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** t)), erro, i)
+                for i, _, _, _, t in lote
+            ],
+        )
+    finally:
+        conn.close()
+
+# ----------------------------------------------------------------------------
+# Envio em segundo plano
+# ----------------------------------------------------------------------------
+_acordar = threading.Event()
+_enviados = threading.Condition()
+
+def _proxima_espera() -> float:
+    conn = _conectar()
+    try:
+        (proxima,) = conn.execute("SELECT min(proxima_em) FROM fila WHERE falhou = 0;").fetchone()
+    finally:
+        conn.close()
+    if proxima is None:
+        return LIMPEZA_INTERVALO
+    return min(max(proxima - time.time(), 0.0), LIMPEZA_INTERVALO)
+
+def enviar_pendentes() -> int:
+    # Drena o que estiver vencido; devolve quantos itens saíram da fila
+    total = 0
+    while True:
+        lote = _reservar_lote()
+        if not lote:
+            return total
+        itens = [(chave, op, json.loads(dados, object_hook=_decodificar)) for _, chave, op, dados, _ in lote]
+        try:
+            aplicadas, falhas = aplicar_escritas(itens)
+        except Exception as e:
+            _adiar(lote, f"{type(e).__name__}: {e}".strip())
+            return total
+        _concluir(aplicadas, falhas)
+        total += len(aplicadas) + len(falhas)
+        with _enviados:
+            _enviados.notify_all()
+
+def _loop_envio():
+    ultima_limpeza = 0.0
+    while True:
+        try:
+            enviar_pendentes()
+            if time.monotonic() - ultima_limpeza > LIMPEZA_INTERVALO:
+                limpar_escritas_aplicadas()
+                ultima_limpeza = time.monotonic()
+            espera = _proxima_espera()
+        except Exception:
+            espera = BACKOFF_BASE * 5
+        _acordar.wait(espera)
+        _acordar.clear()
+
+def aguardar(chave: str, timeout: float = ESPERA_FORMULARIO) -> tuple[str, str | None]:
+    # ("sincronizado" | "pendente" | "erro", mensagem de erro)
+    limite = time.monotonic() + timeout
+    with _enviados:
+        while True:
+            item = _status_item(chave)
+            if item is None:
+                return "sincronizado", None
+            if item[0]:
+                return "erro", item[1]
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return "pendente", None
+            _enviados.wait(restante)
+
+# ----------------------------------------------------------------------------
+# Status (indicador "pendente de sincronização")
+# ----------------------------------------------------------------------------
+def _status_item(chave: str):
+    conn = _conectar()
+    try:
+        return conn.execute("SELECT falhou, erro FROM fila WHERE chave = ?;", (chave,)).fetchone()
+    finally:
+        conn.close()
+
+def status_fila(dono: str | None = None) -> dict:
+    # dono None = fila inteira (admin)
+    _iniciar()
+    conn = _conectar()
+    try:
+        filtro, params = ("WHERE dono = ?", (dono,)) if dono is not None else ("", ())
+        pendentes, com_erro, mais_antigo = conn.execute(
+            f"""
+            SELECT coalesce(sum(falhou = 0), 0), coalesce(sum(falhou = 1), 0),
+                   min(CASE WHEN falhou = 0 THEN criado_em END)
+            FROM fila {filtro};
+            """,
+            params,
+        ).fetchone()
+        erros = conn.execute(
+            f"SELECT chave, operacao, dados, erro, criado_em FROM fila {filtro} {'AND' if filtro else 'WHERE'} falhou = 1 "
+            "ORDER BY id DESC LIMIT 20;",
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return {
+        "pendentes": pendentes,
+        "com_erro": com_erro,
+        "atraso_s": (time.time() - mais_antigo) if mais_antigo else 0.0,
+        "erros": erros,
+    }
+
+def descartar(chave: str):
+    conn = _conectar()
+    try:
+        conn.execute("DELETE FROM fila WHERE chave = ? AND falhou = 1;", (chave,))
+    finally:
+        conn.close()
@@ -0,0 +1,208 @@
+# importacao.py — Yassaka | Importação em massa (CSV/XLSX) de propostas e atividades via COPY
+import csv
+import io
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+import pandas as pd
+
+from db import chave_cliente, conexao, invalidar_cache
+
+TAM_LOTE = 5000
+
+# Colunas esperadas no arquivo por tipo de importação
+LAYOUTS = {
+    "propostas": {
+        "tabela": "propostas",
+        "obrigatorias": ["cliente", "produto", "valor", "head_responsavel"],
+        "opcionais": {"turmas": "1", "qmf": "F"},
+        "tamanhos": {"cliente": 150, "produto": 120, "head_responsavel": 100},
+        "destino": ["cliente", "produto", "valor", "turmas", "head_responsavel", "qmf"],
+        "select": "cliente, produto, valor::numeric(18,2), turmas::int, head_responsavel, qmf",
+    },
+    "contatos": {
+        "tabela": "contatos_efetivos",
+        "obrigatorias": ["owner_username", "data", "cliente"],
+        "opcionais": {"responsavel": None},
+        "tamanhos": {"owner_username": 100, "cliente": 200, "responsavel": 150},
+        "destino": ["owner_username", "data", "cliente", "responsavel"],
+        "select": "owner_username, data::date, cliente, responsavel",
+    },
+    "reunioes": {
+        "tabela": "reunioes_efetivadas",
+        "obrigatorias": ["owner_username", "data", "cliente"],
+        "opcionais": {"responsavel": None},
+        "tamanhos": {"owner_username": 100, "cliente": 200, "responsavel": 150},
+        "destino": ["owner_username", "data", "cliente", "responsavel"],
+        "select": "owner_username, data::date, cliente, responsavel",
+    },
+}
+
+# Número decimal já "limpo" (ponto como separador), como o Decimal() aceita em _parse_valor_brl
+_RE_NUMERO = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)"
+# Limites dos casts do SELECT de cada layout (valor::numeric(18,2), turmas::int)
+VALOR_LIMITE = 10**16
+TURMAS_LIMITE = 2**31 - 1
+
+@dataclass
+class ResultadoImportacao:
+    lidas: int = 0
+    importadas: int = 0
+    erros: list = field(default_factory=list)  # [(linha, coluna, mensagem)]
+
+    def relatorio(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.erros, columns=["linha", "coluna", "erro"])
+        return df.sort_values("linha", kind="stable", ignore_index=True)
+
+# ----------------------------------------------------------------------------
+# Parsing/validação vetorizados
+# ----------------------------------------------------------------------------
+def parse_valor_brl_series(s: pd.Series) -> pd.Series:
+    # Mesmas regras de app._parse_valor_brl, coluna inteira de uma vez:
+    # "1.234,56" -> "1234.56"; "1234,56" -> "1234.56"; "1234.56" fica como está.
+    # Valores inválidos viram NA. O arredondamento (ROUND_HALF_UP em 2 casas)
+    # fica a cargo do cast ::numeric(18,2) do Postgres, que usa a mesma regra.
+    clean = s.astype("string").str.strip().str.replace("R$", "", regex=False).str.replace(" ", "", regex=False)
+    tem_virgula = clean.str.contains(",", regex=False)
+    tem_ponto = clean.str.contains(".", regex=False)
+    ambos = tem_virgula & tem_ponto
+    clean = clean.mask(ambos, clean.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    clean = clean.mask(tem_virgula & ~ambos, clean.str.replace(",", ".", regex=False))
+    return clean.where(clean.str.fullmatch(_RE_NUMERO).fillna(False).astype(bool))
+
+def _valor_fora_do_limite(valor: pd.Series) -> pd.Series:
+    # Conta exata (Decimal, arredondando como o cast) só nas candidatas — parte
+    # inteira com 16+ dígitos; float perderia a última casa justamente aqui
+    digitos = valor.str.lstrip("+-").str.split(".", n=1).str[0].str.lstrip("0").str.len()
+    candidatas = valor[(digitos >= 16).fillna(False).astype(bool)]
+    fora = pd.Series(False, index=valor.index)
+    fora[candidatas.index] = [
+        abs(Decimal(v).quantize(Decimal("0.01"), ROUND_HALF_UP)) >= VALOR_LIMITE for v in candidatas
+    ]
+    return fora
+
+def _validar_lote(df: pd.DataFrame, layout: dict, primeira_linha: int, resultado: ResultadoImportacao) -> pd.DataFrame:
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    # Linha do arquivo (1 = cabeçalho) para o relatório de erros
+    df.insert(0, "_linha", range(primeira_linha, primeira_linha + len(df)))
+    for col, default in layout["opcionais"].items():
+        if col not in df.columns:
+            df[col] = default
+    for col in layout["obrigatorias"] + list(layout["opcionais"]):
+        df[col] = df[col].astype("string").str.strip()
+    for col, default in layout["opcionais"].items():
+        if default is not None:
+            df[col] = df[col].mask(df[col].isna() | (df[col] == "").fillna(True), default)
+
+    if "responsavel" in df.columns:
+        vazio = df["responsavel"].isna() | (df["responsavel"] == "")
+        df["responsavel"] = df["responsavel"].mask(vazio, df["owner_username"])
+
+    ok = pd.Series(True, index=df.index)
+
+    def reprovar(mascara: pd.Series, coluna: str, mensagem: str):
+        # Todas as falhas de cada linha entram no relatório, não só a primeira
+        nonlocal ok
+        mascara = mascara.fillna(False).astype(bool)
+        for linha in df.loc[mascara, "_linha"]:
+            resultado.erros.append((int(linha), coluna, mensagem))
+        ok &= ~mascara
+
+    for col in layout["obrigatorias"]:
+        reprovar(df[col].isna() | (df[col] == "").fillna(True), col, "campo obrigatório vazio")
+    for col, tam in layout["tamanhos"].items():
+        reprovar(df[col].str.len() > tam, col, f"mais de {tam} caracteres")
+
+    if "valor" in df.columns:
+        valor = parse_valor_brl_series(df["valor"])
+        reprovar(valor.isna(), "valor", "valor inválido (use ex.: 1234,56)")
+        # numeric(18,2): acima disso o cast falharia dentro do merge e derrubaria
+        # a importação inteira, em vez de reprovar só a linha
+        reprovar(_valor_fora_do_limite(valor), "valor", "valor fora do limite (máx. 9.999.999.999.999.999,99)")
+        df["valor"] = valor
+    if "qmf" in df.columns:
+        df["qmf"] = df["qmf"].str.upper().str[:1]
+        reprovar(~df["qmf"].isin(["Q", "M", "F"]), "qmf", "QMF deve ser Q, M ou F")
+    if "turmas" in df.columns:
+        turmas = pd.to_numeric(df["turmas"], errors="coerce")
+        reprovar(turmas.isna() | (turmas < 1) | (turmas % 1 != 0), "turmas", "turmas deve ser inteiro >= 1")
+        reprovar(turmas > TURMAS_LIMITE, "turmas", f"turmas acima de {TURMAS_LIMITE}")
+        df["turmas"] = turmas.fillna(1).astype("int64").astype("string")
+    if "data" in df.columns:
+        datas = pd.to_datetime(df["data"], dayfirst=True, errors="coerce")
+        reprovar(datas.isna(), "data", "data inválida (use DD/MM/AAAA)")
+        df["data"] = datas.dt.strftime("%Y-%m-%d")
+
+    validos = df.loc[ok, ["_linha"] + layout["destino"]]
+    return validos.assign(cliente_chave=validos["cliente"].map(chave_cliente))
+
+def _ler_lotes(arquivo, nome: str, sep: str, encoding: str):
+    if nome.lower().endswith((".xlsx", ".xls")):
+        # XLSX não tem leitura incremental no pandas: lê a planilha e fatia em lotes
+        df = pd.read_excel(arquivo, dtype=str)
+        for inicio in range(0, len(df), TAM_LOTE):
+            yield df.iloc[inicio:inicio + TAM_LOTE]
+        return
+    yield from pd.read_csv(
+        arquivo, sep=sep, encoding=encoding, dtype=str, keep_default_na=False,
+        chunksize=TAM_LOTE,
+    )
+
+# ----------------------------------------------------------------------------
+# Carga: COPY para staging + merge numa transação só
+# ----------------------------------------------------------------------------
+def importar_arquivo(arquivo, nome: str, tipo: str, sep: str = ";", encoding: str = "utf-8-sig",
+                     progresso=None) -> ResultadoImportacao:
+    layout = LAYOUTS[tipo]
+    colunas = ["_linha"] + layout["destino"] + ["cliente_chave"]
+    resultado = ResultadoImportacao()
+
+    with conexao() as conn, conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE stg_importacao ({", ".join(f"{c} TEXT" for c in colunas)})
+            ON COMMIT DROP;
+            """
+        )
+        proxima_linha = 2  # linha 1 é o cabeçalho
+        for lote in _ler_lotes(arquivo, nome, sep, encoding):
+            faltando = [c for c in layout["obrigatorias"] if c not in {str(x).strip().lower() for x in lote.columns}]
+            if faltando:
+                raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+            validos = _validar_lote(lote, layout, proxima_linha, resultado)
+            resultado.lidas += len(lote)
+            proxima_linha += len(lote)
+
+            buf = io.StringIO()
+            validos.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+            buf.seek(0)
+            cur.copy_expert(
+                f"COPY stg_importacao ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buf
+            )
+            if progresso:
+                progresso(resultado.lidas)
+
+        # Clientes novos primeiro (o 1º nome de cada chave no arquivo vira o nome
+        # canônico); depois cada linha pega o cliente_id pela chave
+        cur.execute(
+            """
+            INSERT INTO app.clientes (chave, nome)
+            SELECT DISTINCT ON (cliente_chave) cliente_chave, cliente
+            FROM stg_importacao
+            ORDER BY cliente_chave, _linha::int
+            ON CONFLICT (chave) DO NOTHING;
+            """
+        )
+        cur.execute(
+            f"""
+            INSERT INTO app.{layout["tabela"]} ({", ".join(layout["destino"])}, cliente_id)
+            SELECT {layout["select"]},
+                   (SELECT c.id FROM app.clientes c WHERE c.chave = cliente_chave)
+            FROM stg_importacao
+            ORDER BY _linha::int;
+            """
+        )
+        resultado.importadas = cur.rowcount
+
+    invalidar_cache(layout["tabela"])
+    return resultado
@@ -0,0 +1,206 @@
+# kpis.py — Yassaka | Rollups de KPI atualizados incrementalmente (watermark por transação)
+#
+# app.kpi_propostas_mes       — valor/turmas/quantidade por mês × head × QMF
+# app.kpi_atividades_semana   — contatos/reuniões por semana × dono
+#
+# A cada atualização só as inserções novas de cada fonte são agregadas e
+# somadas (upsert) nos rollups. O painel lê só os rollups: algumas centenas de
+# linhas, não o histórico inteiro.
+#
+# As inserções novas saem do change_log (migração 10), pelo xid da transação
+# que gravou — o mesmo watermark do feed de mudanças (mudancas.py): o delta
+# cobre [ultimo_xid, ate), com `ate` = a transação mais antiga ainda aberta.
+# Tudo abaixo dela já terminou, então nenhuma linha com xid < ate aparece
+# depois e nada é pulado, sem travar as tabelas de origem (as inserções dos
+# formulários, da fila e da API seguem normalmente durante a atualização).
+#
+# O recálculo completo agrega as tabelas num snapshot (REPEATABLE READ) e
+# guarda esse snapshot em `base`: os deltas seguintes ignoram as transações
+# que ele já enxergava, então nada é contado duas vezes.
+import threading
+import time
+from datetime import date
+
+from db import _medida, conexao, conexao_leitura
+
+# Atualização automática ao abrir o painel, no máximo uma vez por intervalo (por processo)
+INTERVALO_ATUALIZACAO = 60.0
+
+# Chave arbitrária (fixa) do advisory lock: uma atualização por vez entre processos
+LOCK_KPIS = 0x4B50495A
+
+# {origem}: a tabela inteira (recálculo) ou as inserções do change_log (delta)
+_AGREGACOES = {
+    "propostas": """
+        INSERT INTO app.kpi_propostas_mes AS k
+            (mes, head_responsavel, qmf, qtd, valor_total, turmas_total)
+        SELECT date_trunc('month', criado_em)::date, head_responsavel, qmf,
+               count(*), sum(valor), sum(turmas)
+        FROM {origem}
+        GROUP BY 1, 2, 3
+        ON CONFLICT (mes, head_responsavel, qmf) DO UPDATE
+           SET qtd          = k.qtd + EXCLUDED.qtd,
+               valor_total  = k.valor_total + EXCLUDED.valor_total,
+               turmas_total = k.turmas_total + EXCLUDED.turmas_total;
+    """,
+    "contatos_efetivos": """
+        INSERT INTO app.kpi_atividades_semana AS k (semana, owner_username, tipo, qtd)
+        SELECT date_trunc('week', data)::date, owner_username, 'contato', count(*)
+        FROM {origem}
+        GROUP BY 1, 2
+        ON CONFLICT (semana, owner_username, tipo) DO UPDATE
+           SET qtd = k.qtd + EXCLUDED.qtd;
+    """,
+    "reunioes_efetivadas": """
+        INSERT INTO app.kpi_atividades_semana AS k (semana, owner_username, tipo, qtd)
+        SELECT date_trunc('week', data)::date, owner_username, 'reuniao', count(*)
+        FROM {origem}
+        GROUP BY 1, 2
+        ON CONFLICT (semana, owner_username, tipo) DO UPDATE
+           SET qtd = k.qtd + EXCLUDED.qtd;
+    """,
+}
+
+# Linhas inseridas em [de, ate), de volta ao tipo da tabela; pelo índice
+# (tabela, xid, seq) do change_log
+_ORIGEM_DELTA = """(
+    SELECT (jsonb_populate_record(NULL::app.{fonte}, dados)).*
+    FROM app.change_log
+    WHERE tabela = '{fonte}' AND operacao = 'I'
+      AND xid >= %(de)s::xid8 AND xid < %(ate)s::xid8
+      AND NOT COALESCE(pg_visible_in_snapshot(xid, %(base)s::pg_snapshot), false)
+) AS linhas"""
+
+_ultima_atualizacao = 0.0
+_lock_atualizacao = threading.Lock()
+
+def _travar(conn, esperar: bool) -> bool:
+    with conn, conn.cursor() as cur:
+        if esperar:
+            cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_KPIS,))
+            return True
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (LOCK_KPIS,))
+        return cur.fetchone()[0]
+
+def _destravar(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_KPIS,))
+
+def _precisa_recalcular(conn) -> bool:
+    # Nunca reconstruído neste formato, ou o log já foi limpo além do watermark
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT bool_or(ultimo_xid IS NULL OR ultimo_xid < (SELECT xid FROM app.change_log_corte))
+            FROM app.kpi_watermark;
+            """
+        )
+        return bool(cur.fetchone()[0])
+
+def _atualizar_fonte(conn, fonte: str):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ultimo_xid::text, base::text FROM app.kpi_watermark WHERE fonte = %s;", (fonte,))
+        de, base = cur.fetchone()
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text;")
+        ate = cur.fetchone()[0]
+        if int(ate) <= int(de):
+            return
+        cur.execute(
+            _AGREGACOES[fonte].format(origem=_ORIGEM_DELTA.format(fonte=fonte)),
+            {"de": de, "ate": ate, "base": base},
+        )
+        cur.execute(
+            "UPDATE app.kpi_watermark SET ultimo_xid = %s::xid8, atualizado_em = now() WHERE fonte = %s;",
+            (ate, fonte),
+        )
+
+def _recalcular(conn):
+    conn.set_session(isolation_level="REPEATABLE READ")
+    try:
+        with conn, conn.cursor() as cur:
+            # Primeiro comando: fixa o snapshot de todas as agregações abaixo
+            cur.execute("SELECT pg_current_snapshot()::text;")
+            base = cur.fetchone()[0]
+            cur.execute("TRUNCATE app.kpi_propostas_mes, app.kpi_atividades_semana;")
+            for fonte, sql in _AGREGACOES.items():
+                cur.execute(sql.format(origem=f"app.{fonte}"))
+            cur.execute(
+                """
+                UPDATE app.kpi_watermark
+                SET ultimo_xid = pg_snapshot_xmin(%(base)s::pg_snapshot), base = %(base)s::pg_snapshot,
+                    atualizado_em = now();
+                """,
+                {"base": base},
+            )
+    finally:
+        conn.set_session(isolation_level="DEFAULT")
+
+@_medida
+def atualizar_kpis(forcar: bool = False) -> bool:
+    # Devolve True se rodou (False se foi pulada pelo intervalo mínimo ou porque
+    # outro processo está atualizando agora)
+    global _ultima_atualizacao
+    with _lock_atualizacao:
+        if not forcar and time.monotonic() - _ultima_atualizacao < INTERVALO_ATUALIZACAO:
+            return False
+        with conexao() as conn:
+            if not _travar(conn, esperar=False):
+                return False
+            try:
+                if _precisa_recalcular(conn):
+                    _recalcular(conn)
+                for fonte in _AGREGACOES:
+                    _atualizar_fonte(conn, fonte)
+            finally:
+                _destravar(conn)
+        _ultima_atualizacao = time.monotonic()
+        return True
+
+def recalcular_kpis():
+    # Reconstrução completa (ex.: após correção manual de dados antigos)
+    global _ultima_atualizacao
+    with _lock_atualizacao:
+        with conexao() as conn:
+            _travar(conn, esperar=True)
+            try:
+                _recalcular(conn)
+            finally:
+                _destravar(conn)
+        _ultima_atualizacao = time.monotonic()
+
+# ----------------------------------------------------------------------------
+# Leituras do painel (só rollups)
+# ----------------------------------------------------------------------------
+@_medida
+def kpis_propostas(mes_ini: date, mes_fim: date):
+    with conexao_leitura() as cur:
+        cur.execute(
+            """
+            SELECT mes, head_responsavel, qmf, qtd, valor_total, turmas_total
+            FROM app.kpi_propostas_mes
+            WHERE mes BETWEEN %s AND %s
+            ORDER BY mes, head_responsavel, qmf;
+            """,
+            (mes_ini, mes_fim),
+        )
+        return cur.fetchall()
+
+@_medida
+def kpis_atividades(semana_ini: date, semana_fim: date):
+    with conexao_leitura() as cur:
+        cur.execute(
+            """
+            SELECT semana, owner_username, tipo, qtd
+            FROM app.kpi_atividades_semana
+            WHERE semana BETWEEN %s AND %s
+            ORDER BY semana, owner_username, tipo;
+            """,
+            (semana_ini, semana_fim),
+        )
+        return cur.fetchall()
+
+@_medida
+def kpis_watermarks():
+    with conexao_leitura() as cur:
+        cur.execute("SELECT fonte, ultimo_xid::text, atualizado_em FROM app.kpi_watermark ORDER BY fonte;")
+        return cur.fetchall()
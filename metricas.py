@@ -0,0 +1,149 @@
+# metricas.py — Yassaka | Métricas em memória: histogramas, consultas lentas e texto Prometheus
+#
+# Tudo por processo e com memória limitada: cada série é um histograma de
+# buckets fixos (não guarda amostras), o número de séries tem teto e o log de
+# consultas lentas é um deque. A coleta (cursor, pool, funções, reruns) fica
+# em db.py; aqui só a estrutura e a exportação.
+import threading
+from collections import deque
+
+# Limites superiores dos buckets, em ms (+Inf implícito)
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SERIE_EXCEDENTE = "(outras)"
+
+# tipo -> (descrição, o que `quantidade` conta)
+TIPOS = {
+    "funcao": ("Duração das funções de dados (inclui acertos de cache)", "linhas"),
+    "consulta": ("Duração de cada comando SQL", "linhas"),
+    "conexao": ("Espera para obter uma conexão do pool", None),
+    "pagina": ("Duração do rerun completo do script, por página", "consultas"),
+}
+
+class Histograma:
+    __slots__ = ("contagens", "n", "soma_ms", "max_ms", "erros", "quantidade", "espera_ms")
+
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+        self.erros = 0
+        self.quantidade = 0
+        self.espera_ms = 0.0
+
+    def observar(self, ms: float, erro: bool = False, quantidade: int = 0, espera_ms: float = 0.0):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.contagens[i] += 1
+        self.n += 1
+        self.soma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.erros += erro
+        self.quantidade += quantidade
+        self.espera_ms += espera_ms
+
+    def percentil(self, p: float) -> float | None:
+        # Estimativa por interpolação linear dentro do bucket
+        if not self.n:
+            return None
+        alvo = p / 100 * self.n
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            if c and acumulado + c >= alvo:
+                inferior = BUCKETS_MS[i - 1] if i else 0.0
+                superior = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return min(inferior + (superior - inferior) * (alvo - acumulado) / c, self.max_ms)
+            acumulado += c
+        return self.max_ms
+
+    def resumo(self) -> dict:
+        return {
+            "n": self.n,
+            "erros": self.erros,
+            "media_ms": round(self.soma_ms / self.n, 2) if self.n else None,
+            "p50_ms": _arred(self.percentil(50)),
+            "p95_ms": _arred(self.percentil(95)),
+            "p99_ms": _arred(self.percentil(99)),
+            "max_ms": round(self.max_ms, 2),
+            "total_s": round(self.soma_ms / 1000, 3),
+            "quantidade": self.quantidade,
+            "espera_ms": round(self.espera_ms, 2),
+        }
+
+def _arred(v):
+    return round(v, 2) if v is not None else None
+
+class Metricas:
+    def __init__(self, max_series: int = 300, max_lentas: int = 50):
+        self._max_series = max_series
+        self._lock = threading.Lock()
+        self._series = {}  # (tipo, nome) -> Histograma
+        self._lentas = deque(maxlen=max_lentas)
+
+    def observar(self, tipo: str, nome: str, ms: float, erro: bool = False,
+                 quantidade: int = 0, espera_ms: float = 0.0):
+        with self._lock:
+            h = self._series.get((tipo, nome))
+            if h is None:
+                # Teto de séries: nomes novos além do limite caem numa série só
+                if len(self._series) >= self._max_series:
+                    nome = SERIE_EXCEDENTE
+                h = self._series.setdefault((tipo, nome), Histograma())
+            h.observar(ms, erro, quantidade, espera_ms)
+
+    def registrar_lenta(self, entrada: dict):
+        # `entrada` pode ser completada depois (ex.: o plano do EXPLAIN)
+        with self._lock:
+            self._lentas.appendleft(entrada)
+
+    def resumo(self, tipo: str) -> list[dict]:
+        with self._lock:
+            linhas = [{"nome": nome, **h.resumo()} for (t, nome), h in self._series.items() if t == tipo]
+        return sorted(linhas, key=lambda r: r["total_s"], reverse=True)
+
+    def lentas(self) -> list[dict]:
+        with self._lock:
+            return [dict(e) for e in self._lentas]
+
+    def limpar(self):
+        with self._lock:
+            self._series.clear()
+            self._lentas.clear()
+
+    def prometheus(self, medidores: dict | None = None, prefixo: str = "yassaka") -> str:
+        # Formato de exposição em texto (version 0.0.4)
+        with self._lock:
+            series = [(t, nome, list(h.contagens), h.n, h.soma_ms, h.erros, h.quantidade)
+                      for (t, nome), h in self._series.items()]
+        linhas = []
+        for tipo, (descricao, quantidade) in TIPOS.items():
+            do_tipo = [s for s in series if s[0] == tipo]
+            if not do_tipo:
+                continue
+            metrica = f"{prefixo}_{tipo}_segundos"
+            linhas += [f"# HELP {metrica} {descricao}.", f"# TYPE {metrica} histogram"]
+            for _, nome, contagens, n, soma_ms, _, _ in do_tipo:
+                rotulo = f'nome="{_escapar(nome)}"'
+                acumulado = 0
+                for limite, c in zip(BUCKETS_MS, contagens):
+                    acumulado += c
+                    linhas.append(f'{metrica}_bucket{{{rotulo},le="{limite / 1000:g}"}} {acumulado}')
+                linhas.append(f'{metrica}_bucket{{{rotulo},le="+Inf"}} {n}')
+                linhas.append(f"{metrica}_sum{{{rotulo}}} {soma_ms / 1000:.6f}")
+                linhas.append(f"{metrica}_count{{{rotulo}}} {n}")
+            contadores = [(f"{prefixo}_{tipo}_erros_total", 5, "Chamadas com erro.")]
+            if quantidade:
+                contadores.append((f"{prefixo}_{tipo}_{quantidade}_total", 6, f"Total de {quantidade}."))
+            for metrica, pos, descricao_contador in contadores:
+                linhas += [f"# HELP {metrica} {descricao_contador}", f"# TYPE {metrica} counter"]
+                linhas += [f'{metrica}{{nome="{_escapar(s[1])}"}} {s[pos]}' for s in do_tipo]
+        for nome, valor in (medidores or {}).items():
+            if valor is None:
+                continue
+            metrica = f"{prefixo}_{nome}"
+            linhas += [f"# TYPE {metrica} gauge", f"{metrica} {float(valor):g}"]
+        return "\n".join(linhas) + "\n"
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
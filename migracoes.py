@@ -0,0 +1,536 @@
+# migracoes.py — Yassaka | Migrações versionadas do schema (app.schema_version)
+#
+# Cada migração roda uma única vez, em ordem, na sua própria transação. A
+# aplicação é serializada entre processos por um advisory lock, então vários
+# servidores subindo juntos não disputam o mesmo DDL.
+# Para alterar o schema: acrescente uma nova entrada no FIM da lista — nunca
+# edite uma migração já aplicada.
+
+# Chave arbitrária (fixa) do advisory lock das migrações
+LOCK_MIGRACOES = 0x59A55A4A
+
+def _sql_particionar(tabela: str, prefixo_idx: str) -> str:
+    # Troca a tabela por uma particionada por mês de criado_em (mesmas colunas,
+    # mesma sequence de id) e copia as linhas. A PK passa a incluir criado_em
+    # (exigência do particionamento); nada referencia esses ids por FK.
+    return f"""
+        ALTER TABLE app.{tabela} RENAME TO {tabela}_legado;
+        ALTER INDEX app.{tabela}_pkey RENAME TO {tabela}_legado_pkey;
+
+        CREATE TABLE app.{tabela} (
+          id              INTEGER NOT NULL DEFAULT nextval('app.{tabela}_id_seq'),
+          owner_username  VARCHAR(100) NOT NULL,
+          data            DATE NOT NULL,
+          cliente         VARCHAR(200) NOT NULL,
+          responsavel     VARCHAR(150) NOT NULL,
+          criado_em       TIMESTAMPTZ NOT NULL DEFAULT now(),
+          cliente_id      INTEGER REFERENCES app.clientes (id),
+          PRIMARY KEY (id, criado_em)
+        ) PARTITION BY RANGE (criado_em);
+        ALTER SEQUENCE app.{tabela}_id_seq OWNED BY app.{tabela}.id;
+        CREATE TABLE app.{tabela}_default PARTITION OF app.{tabela} DEFAULT;
+
+        SELECT app.criar_particao_mensal('{tabela}', m::date)
+        FROM generate_series(
+          date_trunc('month', COALESCE((SELECT min(criado_em) FROM app.{tabela}_legado), now()) AT TIME ZONE 'UTC'),
+          date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+          interval '1 month'
+        ) m;
+
+        INSERT INTO app.{tabela} (id, owner_username, data, cliente, responsavel, criado_em, cliente_id)
+        SELECT id, owner_username, data, cliente, responsavel, criado_em, cliente_id
+        FROM app.{tabela}_legado;
+        DROP TABLE app.{tabela}_legado;
+
+        CREATE INDEX {prefixo_idx}_owner_id_idx ON app.{tabela} (owner_username, id DESC);
+        CREATE INDEX {prefixo_idx}_cliente_trgm_idx ON app.{tabela} USING gin (cliente gin_trgm_ops);
+        CREATE INDEX {prefixo_idx}_cliente_id_idx ON app.{tabela} (cliente_id, id DESC);
+    """
+
+MIGRACOES = [
+    (
+        1,
+        "schema inicial",
+        """
+        CREATE TABLE IF NOT EXISTS app.usuarios (
+          id           SERIAL PRIMARY KEY,
+          username     VARCHAR(100) UNIQUE NOT NULL,
+          senha_hash   TEXT NOT NULL,
+          role         VARCHAR(20) NOT NULL DEFAULT 'user',
+          is_active    BOOLEAN NOT NULL DEFAULT TRUE,
+          must_change  BOOLEAN NOT NULL DEFAULT FALSE,
+          created_at   TIMESTAMP NOT NULL DEFAULT NOW(),
+          updated_at   TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        ALTER TABLE app.usuarios DROP CONSTRAINT IF EXISTS usuarios_role_chk;
+        ALTER TABLE app.usuarios
+          ADD CONSTRAINT usuarios_role_chk CHECK (role IN ('user','admin','educador'));
+
+        CREATE TABLE IF NOT EXISTS app.propostas (
+          id               SERIAL PRIMARY KEY,
+          cliente          VARCHAR(150) NOT NULL,
+          produto          VARCHAR(120) NOT NULL,
+          valor            NUMERIC(18,2) NOT NULL DEFAULT 0,
+          turmas           INTEGER NOT NULL DEFAULT 1,
+          head_responsavel VARCHAR(100) NOT NULL,
+          qmf              CHAR(1) NOT NULL DEFAULT 'F',
+          criado_em        TIMESTAMP NOT NULL DEFAULT NOW(),
+          CONSTRAINT propostas_qmf_chk CHECK (qmf IN ('Q','M','F'))
+        );
+        ALTER TABLE app.propostas ADD COLUMN IF NOT EXISTS qmf CHAR(1) NOT NULL DEFAULT 'F';
+
+        CREATE TABLE IF NOT EXISTS app.reunioes_efetivadas (
+          id              SERIAL PRIMARY KEY,
+          owner_username  VARCHAR(100) NOT NULL,
+          data            DATE NOT NULL,
+          cliente         VARCHAR(200) NOT NULL,
+          responsavel     VARCHAR(150) NOT NULL,
+          criado_em       TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS app.contatos_efetivos (
+          id              SERIAL PRIMARY KEY,
+          owner_username  VARCHAR(100) NOT NULL,
+          data            DATE NOT NULL,
+          cliente         VARCHAR(200) NOT NULL,
+          responsavel     VARCHAR(150) NOT NULL,
+          criado_em       TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS app.atestados_educadores (
+          id                    SERIAL PRIMARY KEY,
+          owner_username        VARCHAR(100) NOT NULL,
+          mes                   DATE NOT NULL,
+          cliente               VARCHAR(200) NOT NULL,
+          projeto_finalizado    TEXT NOT NULL,
+          atestado_conquistado  TEXT NOT NULL,
+          criado_em             TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """,
+    ),
+    (
+        2,
+        "índices (dono, id DESC) das listagens",
+        """
+        CREATE INDEX IF NOT EXISTS propostas_head_id_idx
+          ON app.propostas (head_responsavel, id DESC);
+        CREATE INDEX IF NOT EXISTS reunioes_owner_id_idx
+          ON app.reunioes_efetivadas (owner_username, id DESC);
+        CREATE INDEX IF NOT EXISTS contatos_owner_id_idx
+          ON app.contatos_efetivos (owner_username, id DESC);
+        CREATE INDEX IF NOT EXISTS atestados_owner_id_idx
+          ON app.atestados_educadores (owner_username, id DESC);
+        """,
+    ),
+    (
+        3,
+        "índices do histórico de propostas",
+        """
+        CREATE INDEX IF NOT EXISTS propostas_valor_id_idx
+          ON app.propostas (valor, id);
+        CREATE INDEX IF NOT EXISTS propostas_head_valor_id_idx
+          ON app.propostas (head_responsavel, valor, id);
+        CREATE INDEX IF NOT EXISTS propostas_criado_em_idx
+          ON app.propostas (criado_em);
+        CREATE INDEX IF NOT EXISTS propostas_cliente_lower_idx
+          ON app.propostas (lower(cliente) text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS propostas_produto_lower_idx
+          ON app.propostas (lower(produto) text_pattern_ops);
+        """,
+    ),
+    (
+        4,
+        "rollups de KPI (propostas por mês, atividades por semana)",
+        """
+        CREATE TABLE IF NOT EXISTS app.kpi_propostas_mes (
+          mes               DATE NOT NULL,
+          head_responsavel  VARCHAR(100) NOT NULL,
+          qmf               CHAR(1) NOT NULL,
+          qtd               INTEGER NOT NULL DEFAULT 0,
+          valor_total       NUMERIC(18,2) NOT NULL DEFAULT 0,
+          turmas_total      INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (mes, head_responsavel, qmf)
+        );
+        CREATE TABLE IF NOT EXISTS app.kpi_atividades_semana (
+          semana          DATE NOT NULL,
+          owner_username  VARCHAR(100) NOT NULL,
+          tipo            VARCHAR(10) NOT NULL,
+          qtd             INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (semana, owner_username, tipo),
+          CONSTRAINT kpi_atividades_tipo_chk CHECK (tipo IN ('contato','reuniao'))
+        );
+        -- Até onde (id) cada tabela de origem já foi agregada
+        CREATE TABLE IF NOT EXISTS app.kpi_watermark (
+          fonte          VARCHAR(40) PRIMARY KEY,
+          ultimo_id      BIGINT NOT NULL DEFAULT 0,
+          atualizado_em  TIMESTAMPTZ
+        );
+        INSERT INTO app.kpi_watermark (fonte) VALUES
+          ('propostas'), ('contatos_efetivos'), ('reunioes_efetivadas')
+        ON CONFLICT (fonte) DO NOTHING;
+        """,
+    ),
+    (
+        5,
+        "busca de clientes por trigramas (pg_trgm)",
+        """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS propostas_cliente_trgm_idx
+          ON app.propostas USING gin (cliente gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS reunioes_cliente_trgm_idx
+          ON app.reunioes_efetivadas USING gin (cliente gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS contatos_cliente_trgm_idx
+          ON app.contatos_efetivos USING gin (cliente gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS atestados_cliente_trgm_idx
+          ON app.atestados_educadores USING gin (cliente gin_trgm_ops);
+        """,
+    ),
+    (
+        6,
+        "clientes normalizados (app.clientes + cliente_id)",
+        # As linhas antigas ficam com cliente_id NULL até rodar `python clientes.py`
+        # (backfill em lotes, fora da migração para não travar as tabelas)
+        """
+        CREATE TABLE IF NOT EXISTS app.clientes (
+          id         SERIAL PRIMARY KEY,
+          chave      VARCHAR(200) NOT NULL UNIQUE,
+          nome       VARCHAR(200) NOT NULL,
+          criado_em  TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        ALTER TABLE app.propostas
+          ADD COLUMN IF NOT EXISTS cliente_id INTEGER REFERENCES app.clientes (id);
+        ALTER TABLE app.reunioes_efetivadas
+          ADD COLUMN IF NOT EXISTS cliente_id INTEGER REFERENCES app.clientes (id);
+        ALTER TABLE app.contatos_efetivos
+          ADD COLUMN IF NOT EXISTS cliente_id INTEGER REFERENCES app.clientes (id);
+        ALTER TABLE app.atestados_educadores
+          ADD COLUMN IF NOT EXISTS cliente_id INTEGER REFERENCES app.clientes (id);
+        CREATE INDEX IF NOT EXISTS propostas_cliente_id_idx
+          ON app.propostas (cliente_id, id DESC);
+        CREATE INDEX IF NOT EXISTS reunioes_cliente_id_idx
+          ON app.reunioes_efetivadas (cliente_id, id DESC);
+        CREATE INDEX IF NOT EXISTS contatos_cliente_id_idx
+          ON app.contatos_efetivos (cliente_id, id DESC);
+        CREATE INDEX IF NOT EXISTS atestados_cliente_id_idx
+          ON app.atestados_educadores (cliente_id, id DESC);
+        """,
+    ),
+    (
+        7,
+        "contatos e reuniões particionados por mês (criado_em)",
+        # Partições mensais em UTC, nomeadas <tabela>_pAAAA_MM. As futuras são
+        # criadas por app.garantir_particoes() (chamada no ensure_schema); as
+        # antigas saem por particoes.py (arquivo.* ou Parquet).
+        """
+        CREATE SCHEMA IF NOT EXISTS arquivo;
+
+        CREATE OR REPLACE FUNCTION app.criar_particao_mensal(tabela text, mes date)
+        RETURNS boolean LANGUAGE plpgsql AS $$
+        DECLARE
+          inicio timestamptz := date_trunc('month', mes::timestamp) AT TIME ZONE 'UTC';
+          fim    timestamptz := (date_trunc('month', mes::timestamp) + interval '1 month') AT TIME ZONE 'UTC';
+          nome   text := format('%s_p%s', tabela, to_char(mes, 'YYYY_MM'));
+        BEGIN
+          IF to_regclass(format('app.%I', nome)) IS NOT NULL THEN
+            RETURN false;
+          END IF;
+          -- Tabela solta + ATTACH: se a manutenção atrasou e linhas caíram na
+          -- partição DEFAULT, elas vêm para a partição nova na mesma transação
+          EXECUTE format('CREATE TABLE app.%I (LIKE app.%I INCLUDING DEFAULTS)', nome, tabela);
+          EXECUTE format(
+            'WITH m AS (DELETE FROM app.%I WHERE criado_em >= %L AND criado_em < %L RETURNING *)
+             INSERT INTO app.%I SELECT * FROM m',
+            tabela || '_default', inicio, fim, nome
+          );
+          EXECUTE format(
+            'ALTER TABLE app.%I ATTACH PARTITION app.%I FOR VALUES FROM (%L) TO (%L)',
+            tabela, nome, inicio, fim
+          );
+          RETURN true;
+        END $$;
+
+        CREATE OR REPLACE FUNCTION app.garantir_particoes(meses_a_frente int DEFAULT 3)
+        RETURNS int LANGUAGE plpgsql AS $$
+        DECLARE
+          t text;
+          m date;
+          criadas int := 0;
+        BEGIN
+          -- Vários processos subindo juntos: um cria, os outros só conferem
+          PERFORM pg_advisory_xact_lock(hashtext('app.garantir_particoes'));
+          FOREACH t IN ARRAY ARRAY['contatos_efetivos', 'reunioes_efetivadas'] LOOP
+            FOR m IN
+              SELECT generate_series(
+                date_trunc('month', now() AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => meses_a_frente),
+                interval '1 month'
+              )::date
+            LOOP
+              IF app.criar_particao_mensal(t, m) THEN
+                criadas := criadas + 1;
+              END IF;
+            END LOOP;
+          END LOOP;
+          RETURN criadas;
+        END $$;
+        """
+        + _sql_particionar("contatos_efetivos", "contatos")
+        + _sql_particionar("reunioes_efetivadas", "reunioes"),
+    ),
+    (
+        8,
+        "chaves de idempotência das escritas (fila local)",
+        """
+        CREATE TABLE IF NOT EXISTS app.escritas_aplicadas (
+          chave       UUID PRIMARY KEY,
+          aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS escritas_aplicadas_em_idx
+          ON app.escritas_aplicadas (aplicada_em);
+        """,
+    ),
+    (
+        9,
+        "tokens de acesso da API (api.py)",
+        # Só o sha256 do token é guardado
+        """
+        CREATE TABLE IF NOT EXISTS app.api_tokens (
+          id           SERIAL PRIMARY KEY,
+          token_hash   CHAR(64) NOT NULL UNIQUE,
+          username     VARCHAR(100) NOT NULL REFERENCES app.usuarios (username) ON DELETE CASCADE,
+          descricao    VARCHAR(200),
+          criado_em    TIMESTAMPTZ NOT NULL DEFAULT now(),
+          expira_em    TIMESTAMPTZ,
+          revogado_em  TIMESTAMPTZ
+        );
+        CREATE INDEX IF NOT EXISTS api_tokens_username_idx ON app.api_tokens (username);
+        """,
+    ),
+    (
+        10,
+        "log de mudanças (CDC) para a atualização incremental do Power BI",
+        # Triggers por comando (não por linha) com tabelas de transição: uma
+        # importação de 100 mil linhas vira um INSERT ... SELECT no log, não 100
+        # mil chamadas. Nas particionadas o trigger fica na tabela-mãe e enxerga
+        # as linhas de todas as partições; comandos que citam a partição direto
+        # (a manutenção de app.criar_particao_mensal) não disparam e não sujam o log.
+        # `xid` é a transação que gravou: é o watermark (ver mudancas.py).
+        """
+        CREATE TABLE IF NOT EXISTS app.change_log (
+          seq          BIGSERIAL PRIMARY KEY,
+          xid          XID8 NOT NULL DEFAULT pg_current_xact_id(),
+          tabela       TEXT NOT NULL,
+          operacao     CHAR(1) NOT NULL CHECK (operacao IN ('I', 'U', 'D')),
+          id           INTEGER NOT NULL,
+          dados        JSONB NOT NULL,
+          alterado_em  TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS change_log_tabela_xid_idx ON app.change_log (tabela, xid, seq);
+        CREATE INDEX IF NOT EXISTS change_log_alterado_em_idx ON app.change_log (alterado_em);
+
+        -- Menor watermark ainda completo no log (sobe com a limpeza)
+        CREATE TABLE IF NOT EXISTS app.change_log_corte (
+          unico  BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (unico),
+          xid    XID8 NOT NULL
+        );
+        INSERT INTO app.change_log_corte (xid) VALUES ('0') ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION app.registrar_mudancas()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            INSERT INTO app.change_log (tabela, operacao, id, dados)
+            SELECT TG_TABLE_NAME, 'D', o.id, to_jsonb(o) FROM antigas o;
+          ELSE
+            INSERT INTO app.change_log (tabela, operacao, id, dados)
+            SELECT TG_TABLE_NAME, left(TG_OP, 1), n.id, to_jsonb(n) FROM novas n;
+          END IF;
+          RETURN NULL;
+        END $$;
+
+        DO $$
+        DECLARE
+          t text;
+        BEGIN
+          FOREACH t IN ARRAY ARRAY['propostas', 'reunioes_efetivadas', 'contatos_efetivos', 'atestados_educadores'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_cdc_ins ON app.%1$I', t);
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_cdc_upd ON app.%1$I', t);
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_cdc_del ON app.%1$I', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_cdc_ins AFTER INSERT ON app.%1$I REFERENCING NEW TABLE AS novas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.registrar_mudancas()', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_cdc_upd AFTER UPDATE ON app.%1$I REFERENCING NEW TABLE AS novas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.registrar_mudancas()', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_cdc_del AFTER DELETE ON app.%1$I REFERENCING OLD TABLE AS antigas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.registrar_mudancas()', t);
+          END LOOP;
+        END $$;
+        """,
+    ),
+    (
+        11,
+        "NOTIFY app_atividade nas escritas (invalidação do cache entre processos)",
+        # Aproveita os triggers por comando da migração 10: além de gravar o log,
+        # avisa o canal com a tabela, os donos afetados e o application_name de
+        # quem escreveu (cada processo do app tem o seu — ver db.ORIGEM). O aviso
+        # só sai no COMMIT e avisos iguais na mesma transação viram um. UPDATE
+        # manda donos NULL (= todos): a linha pode ter mudado de dono. Acima de 50
+        # donos também vai NULL, para caber no limite de 8000 bytes do payload.
+        """
+        CREATE OR REPLACE FUNCTION app.registrar_mudancas()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+          coluna text := CASE TG_TABLE_NAME WHEN 'propostas' THEN 'head_responsavel' ELSE 'owner_username' END;
+          donos jsonb;
+          qtd bigint;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            INSERT INTO app.change_log (tabela, operacao, id, dados)
+            SELECT TG_TABLE_NAME, 'D', o.id, to_jsonb(o) FROM antigas o;
+            SELECT count(*), jsonb_agg(DISTINCT to_jsonb(o) ->> coluna) INTO qtd, donos FROM antigas o;
+          ELSE
+            INSERT INTO app.change_log (tabela, operacao, id, dados)
+            SELECT TG_TABLE_NAME, left(TG_OP, 1), n.id, to_jsonb(n) FROM novas n;
+            SELECT count(*), jsonb_agg(DISTINCT to_jsonb(n) ->> coluna) INTO qtd, donos FROM novas n;
+          END IF;
+          IF qtd > 0 THEN
+            PERFORM pg_notify('app_atividade', json_build_object(
+              't', TG_TABLE_NAME,
+              'op', left(TG_OP, 1),
+              'n', qtd,
+              'donos', CASE WHEN TG_OP <> 'UPDATE' AND jsonb_array_length(donos) <= 50 THEN donos END,
+              'origem', current_setting('application_name')
+            )::text);
+          END IF;
+          RETURN NULL;
+        END $$;
+        """,
+    ),
+    (
+        12,
+        "watermark dos KPIs por transação (xid8 do change_log) em vez de id",
+        # ultimo_xid NULL = rollups ainda não reconstruídos neste formato: a
+        # próxima atualização faz o recálculo completo (ver kpis.py).
+        """
+        ALTER TABLE app.kpi_watermark
+          ADD COLUMN IF NOT EXISTS ultimo_xid XID8,
+          ADD COLUMN IF NOT EXISTS base PG_SNAPSHOT,
+          DROP COLUMN IF EXISTS ultimo_id;
+        """,
+    ),
+    (
+        13,
+        "versão por (mês, dono) de reuniões/atestados (cache do relatório mensal)",
+        # Cada comando que grava reunioes_efetivadas/atestados_educadores soma 1
+        # na versão de cada (mês, dono) que tocou — linhas antigas e novas, então
+        # mudar uma linha de mês/dono conta nos dois. A versão nunca diminui e
+        # sobe a cada COMMIT que mexe no mês: relatorios.py usa a soma das
+        # versões do mês (de um dono ou de todos) como chave do cache, com uma
+        # leitura pela PK. O upsert segue a ordem (mês, dono) para que duas
+        # importações simultâneas não travem uma à outra.
+        """
+        CREATE TABLE IF NOT EXISTS app.relatorio_versao (
+          mes             DATE NOT NULL,
+          owner_username  VARCHAR(100) NOT NULL,
+          versao          BIGINT NOT NULL DEFAULT 0,
+          PRIMARY KEY (mes, owner_username)
+        );
+
+        CREATE OR REPLACE FUNCTION app.versionar_relatorio()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+          coluna text := CASE TG_TABLE_NAME WHEN 'atestados_educadores' THEN 'mes' ELSE 'data' END;
+          meses date[] := '{}';
+          donos text[] := '{}';
+        BEGIN
+          -- Cada tabela de transição só existe no evento que a declara
+          IF TG_OP <> 'DELETE' THEN
+            SELECT meses || array_agg(m), donos || array_agg(d) INTO meses, donos
+            FROM (SELECT DISTINCT date_trunc('month', (to_jsonb(n) ->> coluna)::date)::date AS m,
+                                  n.owner_username AS d FROM novas n) x;
+          END IF;
+          IF TG_OP <> 'INSERT' THEN
+            SELECT meses || array_agg(m), donos || array_agg(d) INTO meses, donos
+            FROM (SELECT DISTINCT date_trunc('month', (to_jsonb(o) ->> coluna)::date)::date AS m,
+                                  o.owner_username AS d FROM antigas o) x;
+          END IF;
+          INSERT INTO app.relatorio_versao AS v (mes, owner_username, versao)
+          SELECT DISTINCT m, d, 1 FROM unnest(meses, donos) AS u(m, d)
+          ORDER BY 1, 2
+          ON CONFLICT (mes, owner_username) DO UPDATE SET versao = v.versao + 1;
+          RETURN NULL;
+        END $$;
+
+        DO $$
+        DECLARE
+          t text;
+        BEGIN
+          FOREACH t IN ARRAY ARRAY['reunioes_efetivadas', 'atestados_educadores'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_versao_ins ON app.%1$I', t);
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_versao_upd ON app.%1$I', t);
+            EXECUTE format('DROP TRIGGER IF EXISTS %1$s_versao_del ON app.%1$I', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_versao_ins AFTER INSERT ON app.%1$I REFERENCING NEW TABLE AS novas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.versionar_relatorio()', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_versao_upd AFTER UPDATE ON app.%1$I '
+              'REFERENCING OLD TABLE AS antigas NEW TABLE AS novas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.versionar_relatorio()', t);
+            EXECUTE format(
+              'CREATE TRIGGER %1$s_versao_del AFTER DELETE ON app.%1$I REFERENCING OLD TABLE AS antigas '
+              'FOR EACH STATEMENT EXECUTE FUNCTION app.versionar_relatorio()', t);
+          END LOOP;
+        END $$;
+        """,
+    ),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+def _versao_aplicada(cur) -> int:
+    cur.execute("SELECT to_regclass('app.schema_version');")
+    if cur.fetchone()[0] is None:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(versao), 0) FROM app.schema_version;")
+    return cur.fetchone()[0]
+
+def aplicar_migracoes(conn) -> list[int]:
+    # Caminho rápido: schema em dia -> só um SELECT, nenhum DDL nem lock
+    with conn, conn.cursor() as cur:
+        if _versao_aplicada(cur) >= VERSAO_ATUAL:
+            return []
+
+    aplicadas = []
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_MIGRACOES,))
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS app;")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS app.schema_version (
+                  versao       INTEGER PRIMARY KEY,
+                  descricao    TEXT NOT NULL,
+                  aplicada_em  TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+        # Relê a versão já com o lock: outro processo pode ter migrado enquanto esperávamos
+        with conn, conn.cursor() as cur:
+            versao = _versao_aplicada(cur)
+        for num, descricao, sql in MIGRACOES:
+            if num <= versao:
+                continue
+            with conn, conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO app.schema_version (versao, descricao) VALUES (%s, %s);",
+                    (num, descricao),
+                )
+            aplicadas.append(num)
+    finally:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_MIGRACOES,))
+    return aplicadas
@@ -0,0 +1,190 @@
+# mudancas.py — Yassaka | Feed incremental (CDC) para o dataset do Power BI
+#
+# Os triggers da migração 10 gravam cada INSERT/UPDATE/DELETE de propostas,
+# reuniões, contatos e atestados em app.change_log. Em vez de reler as tabelas
+# inteiras a cada refresh, o dataset pede só o que mudou desde o último
+# watermark e aplica por id (I/U = upsert da linha, D = remover o id).
+#
+# Watermark = id de transação (xid8). Uma exportação cobre [desde, ate), com
+# `ate` = a transação mais antiga ainda aberta no momento: tudo abaixo dela já
+# terminou, então nada com xid < ate aparece depois — não há buraco mesmo com
+# transações que terminam fora de ordem. O `ate` devolvido é o `desde` da
+# próxima chamada. Primeira carga: exportação completa (exportacao.py) e
+# depois o feed a partir do watermark anterior a ela (linhas repetidas são
+# só upserts).
+#
+# Uso (CLI):
+#   python mudancas.py watermark
+#   python mudancas.py exportar propostas --desde 123456 --formato parquet --saida p.parquet
+#   python mudancas.py limpar --dias 35
+import argparse
+import gzip
+import json
+import sys
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from db import get_connection
+from exportacao import TABELAS_EXPORTAVEIS, TAM_LOTE, escrever_parquet
+
+FORMATOS = ("csv", "json", "parquet")
+DIAS_RETENCAO = 35
+
+class WatermarkExpirado(LookupError):
+    # O log já foi limpo além do watermark pedido: refazer a carga completa
+    pass
+
+def watermark_atual(cur) -> int:
+    cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;")
+    return cur.fetchone()[0]
+
+def _consulta(chave: str, desde: int, ate: int) -> str:
+    # Colunas da própria tabela (jsonb_populate_record) + metadados da mudança
+    tabela = TABELAS_EXPORTAVEIS[chave]
+    return f"""
+        SELECT c.operacao AS _operacao, c.alterado_em AS _alterado_em, c.xid::text::bigint AS _xid, r.*
+        FROM app.change_log c
+        CROSS JOIN LATERAL jsonb_populate_record(NULL::{tabela}, c.dados) r
+        WHERE c.tabela = '{tabela.split(".", 1)[1]}'
+          AND c.xid >= '{int(desde)}'::xid8 AND c.xid < '{int(ate)}'::xid8
+        ORDER BY c.xid, c.seq
+    """
+
+def _valor_json(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    raise TypeError(type(v).__name__)
+
+def _escrever_json(consulta: str, destino, conn, desde: int, ate: int, lote: int = TAM_LOTE):
+    # {"desde", "proximo_watermark", "mudancas": [...]} gravado em streaming
+    destino.write(json.dumps({"desde": desde, "proximo_watermark": ate})[:-1].encode("utf-8"))
+    destino.write(b', "mudancas": [')
+    with conn, conn.cursor(name=f"cdc_{uuid.uuid4().hex[:12]}") as cur:
+        cur.itersize = lote
+        cur.execute(consulta)
+        nomes = None
+        primeira = True
+        while linhas := cur.fetchmany(lote):
+            nomes = nomes or [c.name for c in cur.description]
+            for linha in linhas:
+                destino.write((b"" if primeira else b",") + json.dumps(
+                    dict(zip(nomes, linha)), default=_valor_json, ensure_ascii=False
+                ).encode("utf-8"))
+                primeira = False
+    destino.write(b"]}")
+
+def exportar_mudancas(chave: str, formato: str, destino, desde: int | None = None, conn=None) -> int:
+    # Escreve as mudanças de [desde, agora) em `destino` (binário) e devolve o próximo watermark
+    if chave not in TABELAS_EXPORTAVEIS:
+        raise ValueError(f"Tabela desconhecida: {chave}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            ate = watermark_atual(cur)
+            cur.execute("SELECT xid::text::bigint FROM app.change_log_corte;")
+            corte = cur.fetchone()[0]
+        desde = corte if desde is None else int(desde)
+        if desde < corte:
+            raise WatermarkExpirado(
+                f"Watermark {desde} anterior à retenção do log ({corte}): refaça a carga completa."
+            )
+        ate = max(ate, desde)
+        consulta = _consulta(chave, desde, ate)
+        if formato == "csv":
+            with conn, conn.cursor() as cur:
+                cur.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER, ENCODING 'UTF8')", destino)
+        elif formato == "json":
+            _escrever_json(consulta, destino, conn, desde, ate)
+        else:
+            escrever_parquet(consulta + ";", destino, conn)
+        return ate
+    finally:
+        if proprio:
+            conn.close()
+
+def limpar_mudancas(dias: int = DIAS_RETENCAO, conn=None) -> int:
+    # Apaga o log mais velho que `dias` e sobe o corte: quem pedir um watermark
+    # anterior recebe WatermarkExpirado (em vez de um feed com buraco). Nunca
+    # passa do watermark dos KPIs (kpis.py), que agregam a partir deste log.
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT xid FROM app.change_log_corte FOR UPDATE;")
+            # Corta um prefixo contínuo em xid (o corte tem de valer para o log inteiro)
+            cur.execute(
+                """
+                WITH limite AS (
+                  SELECT max(xid::text::bigint) AS x FROM app.change_log
+                  WHERE alterado_em < now() - %s * interval '1 day'
+                    AND xid < COALESCE((SELECT min(ultimo_xid) FROM app.kpi_watermark),
+                                       pg_snapshot_xmax(pg_current_snapshot()))
+                ), apagadas AS (
+                  DELETE FROM app.change_log c USING limite
+                  WHERE c.xid <= limite.x::text::xid8
+                  RETURNING 1
+                )
+                UPDATE app.change_log_corte
+                SET xid = ((SELECT x FROM limite) + 1)::text::xid8
+                WHERE (SELECT x FROM limite) IS NOT NULL
+                RETURNING (SELECT count(*) FROM apagadas);
+                """,
+                (dias,),
+            )
+            linha = cur.fetchone()
+            return linha[0] if linha else 0
+    finally:
+        if proprio:
+            conn.close()
+
+# ----------------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Feed incremental de mudanças (CDC) para o Power BI.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sub.add_parser("watermark", help="watermark atual (use antes de uma carga completa)")
+
+    p_exp = sub.add_parser("exportar", help="mudanças desde um watermark")
+    p_exp.add_argument("tabela", choices=sorted(TABELAS_EXPORTAVEIS))
+    p_exp.add_argument("--desde", type=int, help="watermark da última exportação (vazio = todo o log)")
+    p_exp.add_argument("--formato", choices=FORMATOS, default="csv")
+    p_exp.add_argument("--saida", default="-", help="arquivo de saída ('-' = stdout; .gz comprime CSV/JSON)")
+
+    p_limpar = sub.add_parser("limpar", help="apaga o log mais antigo que --dias")
+    p_limpar.add_argument("--dias", type=int, default=DIAS_RETENCAO)
+
+    args = parser.parse_args(argv)
+    if args.comando == "watermark":
+        conn = get_connection()
+        try:
+            with conn, conn.cursor() as cur:
+                print(watermark_atual(cur))
+        finally:
+            conn.close()
+    elif args.comando == "limpar":
+        print(f"{limpar_mudancas(args.dias)} mudança(s) apagada(s)")
+    else:
+        if args.formato == "parquet" and (args.saida == "-" or args.saida.endswith(".gz")):
+            parser.error("Parquet precisa de --saida (arquivo, sem .gz).")
+        try:
+            if args.saida == "-":
+                proximo = exportar_mudancas(args.tabela, args.formato, sys.stdout.buffer, args.desde)
+            else:
+                abrir = gzip.open if args.saida.endswith(".gz") else open
+                with abrir(args.saida, "wb") as destino:
+                    proximo = exportar_mudancas(args.tabela, args.formato, destino, args.desde)
+        except WatermarkExpirado as e:
+            sys.exit(str(e))
+        # O próximo watermark vai para o stderr (o stdout pode ser o próprio arquivo)
+        print(f"proximo_watermark={proximo}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# particoes.py — Yassaka | Manutenção das partições mensais de contatos/reuniões
+#
+# app.contatos_efetivos e app.reunioes_efetivadas são particionadas por mês de
+# criado_em (migração 7). As partições futuras são criadas sozinhas (ensure_schema,
+# uma vez por dia por processo); as antigas saem daqui, para o schema `arquivo`
+# (continuam consultáveis, fora das listagens) ou para Parquet (zstd) e DROP.
+# Os rollups de KPI já agregaram essas linhas e não mudam; só um
+# recalcular_kpis() depois do arquivamento deixaria de contá-las.
+#
+# Uso (CLI):
+#   python particoes.py listar
+#   python particoes.py garantir --meses 3
+#   python particoes.py arquivar --manter 24 --modo tabela
+#   python particoes.py arquivar --manter 24 --modo parquet --pasta arquivo/
+import argparse
+import os
+import re
+from datetime import date
+
+from db import PARTICOES_A_FRENTE, get_connection
+from exportacao import escrever_parquet
+
+TABELAS_PARTICIONADAS = ("contatos_efetivos", "reunioes_efetivadas")
+MESES_MANTER = 24
+
+_RE_MES = re.compile(r"_p(\d{4})_(\d{2})$")
+
+def listar_particoes(conn) -> list[tuple]:
+    # [(tabela, particao, mes | None (DEFAULT), linhas estimadas, bytes)]
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT pai.relname, filha.relname, filha.reltuples::bigint,
+                   pg_total_relation_size(filha.oid)
+            FROM pg_inherits i
+            JOIN pg_class pai ON pai.oid = i.inhparent
+            JOIN pg_class filha ON filha.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = pai.relnamespace
+            WHERE n.nspname = 'app' AND pai.relname = ANY(%s)
+            ORDER BY 1, 2;
+            """,
+            (list(TABELAS_PARTICIONADAS),),
+        )
+        linhas = cur.fetchall()
+    resultado = []
+    for tabela, particao, estimadas, tamanho in linhas:
+        m = _RE_MES.search(particao)
+        mes = date(int(m.group(1)), int(m.group(2)), 1) if m else None
+        resultado.append((tabela, particao, mes, max(estimadas, 0), tamanho))
+    return resultado
+
+def garantir_particoes(conn, meses: int = PARTICOES_A_FRENTE) -> int:
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT app.garantir_particoes(%s);", (meses,))
+        return cur.fetchone()[0]
+
+def _primeiro_mes_mantido(manter: int, hoje: date | None = None) -> date:
+    hoje = hoje or date.today()
+    total = hoje.year * 12 + hoje.month - 1 - manter
+    return date(total // 12, total % 12 + 1, 1)
+
+def arquivar_particoes(conn, manter: int = MESES_MANTER, modo: str = "tabela",
+                       pasta: str = "arquivo") -> list[str]:
+    # Partições com mês anterior aos últimos `manter` meses. No modo parquet o
+    # arquivo é escrito ANTES do DETACH/DROP: se a exportação falhar, nada some.
+    if modo not in ("tabela", "parquet"):
+        raise ValueError(f"Modo inválido: {modo} (use tabela ou parquet)")
+    limite = _primeiro_mes_mantido(manter)
+    arquivadas = []
+    for tabela, particao, mes, _, _ in listar_particoes(conn):
+        if mes is None or mes >= limite:
+            continue
+        if modo == "parquet":
+            os.makedirs(pasta, exist_ok=True)
+            escrever_parquet(
+                f"SELECT * FROM app.{particao} ORDER BY id;", os.path.join(pasta, f"{particao}.parquet"), conn
+            )
+        with conn, conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE app.{tabela} DETACH PARTITION app.{particao};")
+            if modo == "parquet":
+                cur.execute(f"DROP TABLE app.{particao};")
+            else:
+                cur.execute(f"DROP TABLE IF EXISTS arquivo.{particao};")
+                cur.execute(f"ALTER TABLE app.{particao} SET SCHEMA arquivo;")
+        arquivadas.append(particao)
+    return arquivadas
+
+# ----------------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partições mensais de contatos/reuniões do Yassaka.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("listar")
+    p_garantir = sub.add_parser("garantir")
+    p_garantir.add_argument("--meses", type=int, default=PARTICOES_A_FRENTE, help="meses à frente")
+    p_arquivar = sub.add_parser("arquivar")
+    p_arquivar.add_argument("--manter", type=int, default=MESES_MANTER, help="meses mantidos nas tabelas")
+    p_arquivar.add_argument("--modo", choices=["tabela", "parquet"], default="tabela")
+    p_arquivar.add_argument("--pasta", default="arquivo", help="destino dos .parquet (modo parquet)")
+    args = parser.parse_args(argv)
+
+    conn = get_connection()
+    try:
+        if args.comando == "listar":
+            for tabela, particao, mes, linhas, tamanho in listar_particoes(conn):
+                print(f"{tabela:22} {particao:34} {mes or 'DEFAULT'!s:10} ~{linhas} linhas  {tamanho // 1024} KiB")
+        elif args.comando == "garantir":
+            print(f"{garantir_particoes(conn, args.meses)} partições criadas")
+        else:
+            for particao in arquivar_particoes(conn, args.manter, args.modo, args.pasta):
+                print(f"arquivada: {particao}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# relatorios.py — Yassaka | Relatório mensal dos educadores (PDF/XLSX), gerado fora da thread do script
+#
+# Um relatório = reuniões efetivadas + atestados de um mês, de um educador ou
+# de todos. Os dados saem de uma consulta agregada por tabela (uma linha por
+# educador, com contagens e o detalhe em json_agg), lidas na mesma transação
+# REPEATABLE READ que a versão — o arquivo corresponde exatamente a ela.
+#
+# Cache em disco por (mês, dono, versão, formato): a versão vem de
+# app.relatorio_versao (migração 13), que um trigger incrementa a cada
+# escrita no (mês, dono) — a do consolidado é a soma das do mês. Consultar é
+# uma leitura pela PK; uma escrita só muda a versão do mês/dono que tocou,
+# então os relatórios dos outros meses continuam em cache. Versão nova = nome
+# novo e o arquivo antigo é apagado. Pedido repetido com a mesma versão é
+# servido direto do disco, sem gerar nada.
+#
+# A geração roda num processo à parte (ProcessPoolExecutor, 1 worker): montar
+# PDF/XLSX é CPU em Python puro e não disputa o GIL com os reruns das sessões.
+# O lote da equipe inteira usa uma conexão e uma consulta por tabela para
+# todos os educadores.
+#
+# Uso (CLI):
+#   python relatorios.py gerar --mes 2026-09 --formato pdf [--dono maria.souza]
+#   python relatorios.py lote --mes 2026-09 --formato pdf xlsx
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from db import _get_setting, conexao_leitura, get_connection
+
+FORMATOS = ("pdf", "xlsx")
+RELATORIOS_DIR = _get_setting("RELATORIOS_DIR", os.path.join(tempfile.gettempdir(), "yassaka_relatorios"))
+TODOS = "_todos"  # nome do arquivo consolidado (não colide: username não começa com "_")
+
+MESES = ("Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+         "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro")
+
+def _limites(mes: date) -> tuple[date, date]:
+    ini = mes.replace(day=1)
+    fim = date(ini.year + ini.month // 12, ini.month % 12 + 1, 1)
+    return ini, fim
+
+# ----------------------------------------------------------------------------
+# Versão e cache em disco
+# ----------------------------------------------------------------------------
+SQL_VERSOES = """
+    SELECT owner_username, versao FROM app.relatorio_versao
+    WHERE mes = %(ini)s AND (%(dono)s::text IS NULL OR owner_username = %(dono)s);
+"""
+
+def versoes(cur, mes: date, dono: str | None) -> dict[str, int]:
+    # {dono: versão} do mês (só as linhas do dono, se informado)
+    cur.execute(SQL_VERSOES, {"ini": mes.replace(day=1), "dono": dono})
+    return dict(cur.fetchall())
+
+def versao(cur, mes: date, dono: str | None) -> int:
+    return sum(versoes(cur, mes, dono).values())
+
+def _nome_dono(dono: str | None) -> str:
+    return TODOS if dono is None else re.sub(r"[^\w.-]", "_", dono)
+
+def _prefixo(mes: date, dono: str | None) -> str:
+    return os.path.join(RELATORIOS_DIR, f"{mes:%Y-%m}_{_nome_dono(dono)}_")
+
+def caminho(mes: date, dono: str | None, ver: int, formato: str) -> str:
+    return f"{_prefixo(mes, dono)}{ver}.{formato}"
+
+def _gravar(mes: date, dono: str | None, ver: int, formato: str, conteudo: bytes) -> str:
+    # Escreve ao lado e renomeia: quem lê o cache nunca vê um arquivo pela metade
+    destino = caminho(mes, dono, ver, formato)
+    os.makedirs(RELATORIOS_DIR, exist_ok=True)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(conteudo)
+    os.replace(tmp, destino)
+    # Versões anteriores do mesmo relatório não servem mais
+    prefixo = _prefixo(mes, dono)
+    for antigo in glob.glob(f"{glob.escape(prefixo)}*.{formato}"):
+        if antigo != destino and re.fullmatch(r"\d+", antigo[len(prefixo):-len(formato) - 1]):
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+    return destino
+
+def em_cache(mes: date, dono: str | None, formato: str) -> str | None:
+    # Consulta só a versão (PK de relatorio_versao: as linhas do mês) — chamada na thread do script
+    with conexao_leitura() as cur:
+        destino = caminho(mes, dono, versao(cur, mes, dono), formato)
+    return destino if os.path.exists(destino) else None
+
+# ----------------------------------------------------------------------------
+# Dados (uma consulta agregada por tabela)
+# ----------------------------------------------------------------------------
+SQL_REUNIOES = """
+    SELECT owner_username, count(*), count(DISTINCT COALESCE(cliente_id::text, cliente)),
+           json_agg(json_build_array(data, cliente, responsavel) ORDER BY data, id)
+    FROM app.reunioes_efetivadas
+    WHERE data >= %(ini)s AND data < %(fim)s
+      AND (%(dono)s::text IS NULL OR owner_username = %(dono)s)
+    GROUP BY owner_username;
+"""
+
+SQL_ATESTADOS = """
+    SELECT owner_username, count(*), count(DISTINCT COALESCE(cliente_id::text, cliente)),
+           json_agg(json_build_array(cliente, projeto_finalizado, atestado_conquistado) ORDER BY id)
+    FROM app.atestados_educadores
+    WHERE mes >= %(ini)s AND mes < %(fim)s
+      AND (%(dono)s::text IS NULL OR owner_username = %(dono)s)
+    GROUP BY owner_username;
+"""
+
+def _ler_dados(conn, mes: date, dono: str | None) -> tuple[dict, dict]:
+    # ({dono: versão}, {dono: {"reunioes": (n, clientes, linhas), "atestados": (...)}})
+    ini, fim = _limites(mes)
+    params = {"ini": ini, "fim": fim, "dono": dono}
+    dados = {}
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        with conn, conn.cursor() as cur:
+            vers = versoes(cur, mes, dono)
+            for chave, sql in (("reunioes", SQL_REUNIOES), ("atestados", SQL_ATESTADOS)):
+                cur.execute(sql, params)
+                for owner, n, clientes, linhas in cur.fetchall():
+                    if chave == "reunioes":
+                        linhas = [(date.fromisoformat(d), cli, resp) for d, cli, resp in linhas]
+                    dados.setdefault(owner, {"reunioes": (0, 0, []), "atestados": (0, 0, [])})
+                    dados[owner][chave] = (n, clientes, [tuple(l) for l in linhas])
+    finally:
+        conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT")
+    return vers, dict(sorted(dados.items()))
+
+# ----------------------------------------------------------------------------
+# Montagem dos arquivos
+# ----------------------------------------------------------------------------
+def _titulo(mes: date, dono: str | None) -> str:
+    return f"Relatório mensal — {MESES[mes.month - 1]}/{mes.year} — {dono or 'Todos os educadores'}"
+
+def montar_xlsx(mes: date, dono: str | None, dados: dict) -> bytes:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    negrito = Font(bold=True)
+
+    def aba(nome, cabecalho, linhas):
+        ws = wb.create_sheet(nome)
+        celulas = []
+        for texto in cabecalho:
+            c = WriteOnlyCell(ws, value=texto)
+            c.font = negrito
+            celulas.append(c)
+        ws.append(celulas)
+        for linha in linhas:
+            ws.append(list(linha))
+
+    resumo = [(o, d["reunioes"][0], d["reunioes"][1], d["atestados"][0]) for o, d in dados.items()]
+    aba("Resumo", ["Educador", "Reuniões", "Clientes (reuniões)", "Atestados"], resumo)
+    aba("Reuniões", ["Educador", "Data", "Cliente", "Responsável"],
+        ((o, *r) for o, d in dados.items() for r in d["reunioes"][2]))
+    aba("Atestados", ["Educador", "Cliente", "Projeto finalizado", "Atestado conquistado"],
+        ((o, *a) for o, d in dados.items() for a in d["atestados"][2]))
+    wb.properties.title = _titulo(mes, dono)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+def _latin1(valor) -> str:
+    # Fontes padrão do PDF são Latin-1: o que não couber vira "?"
+    texto = valor.strftime("%d/%m/%Y") if isinstance(valor, date) else str(valor if valor is not None else "")
+    return texto.encode("latin-1", "replace").decode("latin-1")
+
+def montar_pdf(mes: date, dono: str | None, dados: dict) -> bytes:
+    from fpdf import FPDF  # fpdf2; import tardio: só o relatório em PDF precisa
+
+    pdf = FPDF(format="A4")
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.multi_cell(0, 8, _latin1(_titulo(mes, dono)), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(2)
+
+    def tabela(cabecalho, linhas, larguras):
+        pdf.set_font("Helvetica", size=9)
+        with pdf.table(col_widths=larguras, text_align="LEFT", first_row_as_headings=True) as t:
+            for linha in [cabecalho, *linhas]:
+                row = t.row()
+                for valor in linha:
+                    row.cell(_latin1(valor))
+        pdf.ln(3)
+
+    def secao(texto):
+        pdf.set_font("Helvetica", "B", 11)
+        pdf.cell(0, 7, _latin1(texto), new_x="LMARGIN", new_y="NEXT")
+
+    secao("Resumo")
+    tabela(
+        ["Educador", "Reuniões", "Clientes", "Atestados"],
+        [(o, d["reunioes"][0], d["reunioes"][1], d["atestados"][0]) for o, d in dados.items()]
+        or [("Sem registros no mês", "", "", "")],
+        (4, 1, 1, 1),
+    )
+    for owner, d in dados.items():
+        secao(f"{owner} — {d['reunioes'][0]} reunião(ões), {d['atestados'][0]} atestado(s)")
+        if d["reunioes"][2]:
+            tabela(["Data", "Cliente", "Responsável"], d["reunioes"][2], (1, 3, 2))
+        if d["atestados"][2]:
+            tabela(["Cliente", "Projeto finalizado", "Atestado conquistado"], d["atestados"][2], (2, 3, 3))
+    return bytes(pdf.output())
+
+MONTAR = {"pdf": montar_pdf, "xlsx": montar_xlsx}
+
+# ----------------------------------------------------------------------------
+# Geração (roda no worker ou na CLI)
+# ----------------------------------------------------------------------------
+def gerar_relatorio(mes: date, dono: str | None, formato: str, conn=None) -> str:
+    # Caminho do arquivo (do cache, se a versão não mudou)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            destino = caminho(mes, dono, versao(cur, mes, dono), formato)
+        if os.path.exists(destino):
+            return destino
+        vers, dados = _ler_dados(conn, mes, dono)
+        return _gravar(mes, dono, sum(vers.values()), formato, MONTAR[formato](mes, dono, dados))
+    finally:
+        if proprio:
+            conn.close()
+
+def gerar_lote(mes: date, formatos=FORMATOS, conn=None) -> list[str]:
+    # Equipe inteira: uma leitura (uma consulta por tabela) e, a partir dela,
+    # o consolidado + um arquivo por educador em cada formato
+    for formato in formatos:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    proprio = conn is None
+    conn = conn or get_connection()
+    try:
+        vers, dados = _ler_dados(conn, mes, None)
+    finally:
+        if proprio:
+            conn.close()
+    gerados = []
+    for dono, parte in [(None, dados), *((o, {o: d}) for o, d in dados.items())]:
+        for formato in formatos:
+            ver = sum(vers.values()) if dono is None else vers.get(dono, 0)
+            destino = caminho(mes, dono, ver, formato)
+            if not os.path.exists(destino):
+                destino = _gravar(mes, dono, ver, formato, MONTAR[formato](mes, dono, parte))
+            gerados.append(destino)
+    return gerados
+
+# ----------------------------------------------------------------------------
+# Worker (um processo por servidor, criado no primeiro pedido)
+# ----------------------------------------------------------------------------
+_executor = None
+_lock_executor = threading.Lock()
+
+def _worker() -> ProcessPoolExecutor:
+    global _executor
+    with _lock_executor:
+        if _executor is None:
+            # spawn: um fork do servidor levaria junto threads e conexões abertas
+            _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def solicitar(mes: date, dono: str | None, formato: str):
+    # Caminho (str) se já está em cache; senão um Future que devolve o caminho
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    pronto = em_cache(mes, dono, formato)
+    return pronto or _worker().submit(gerar_relatorio, mes, dono, formato)
+
+def solicitar_lote(mes: date, formatos=FORMATOS):
+    # Future que devolve a lista de caminhos
+    return _worker().submit(gerar_lote, mes, tuple(formatos))
+
+# ----------------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------------
+def _mes(txt: str) -> date:
+    try:
+        ano, mes = txt.split("-")
+        return date(int(ano), int(mes), 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError("use AAAA-MM") from None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório mensal dos educadores (PDF/XLSX).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_gerar = sub.add_parser("gerar", help="um relatório (um educador ou todos)")
+    p_gerar.add_argument("--mes", type=_mes, required=True, help="AAAA-MM")
+    p_gerar.add_argument("--dono", help="username do educador (vazio = todos)")
+    p_gerar.add_argument("--formato", choices=FORMATOS, default="pdf")
+
+    p_lote = sub.add_parser("lote", help="consolidado + um arquivo por educador")
+    p_lote.add_argument("--mes", type=_mes, required=True, help="AAAA-MM")
+    p_lote.add_argument("--formato", choices=FORMATOS, nargs="+", default=list(FORMATOS))
+
+    args = parser.parse_args(argv)
+    try:
+        if args.comando == "gerar":
+            print(gerar_relatorio(args.mes, args.dono, args.formato))
+        else:
+            print("\n".join(gerar_lote(args.mes, args.formato)))
+    except ImportError as e:
+        sys.exit(f"Dependência ausente: {e.name} (PDF requer fpdf2; XLSX requer openpyxl).")
+
+if __name__ == "__main__":
+    main()
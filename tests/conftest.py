@@ -0,0 +1,5 @@
+# conftest.py — Yassaka | Testes rodam da raiz do repositório (módulos soltos, sem pacote)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
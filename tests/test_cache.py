@@ -0,0 +1,122 @@
+# test_cache.py — Yassaka | CacheLeituras: write-through, invalidação por dono, gerações
+import time
+
+from cache import CacheLeituras
+
+def _cache(**kw) -> CacheLeituras:
+    return CacheLeituras(maxsize=kw.pop("maxsize", 16), ttl=kw.pop("ttl", 60.0))
+
+# ----------------------------------------------------------------------------
+# Write-through
+# ----------------------------------------------------------------------------
+def test_insercao_entra_no_topo_da_primeira_pagina():
+    c = _cache()
+    c.put("lista_ana", [("b",), ("a",)], ("propostas",), "ana", meta={"prepend_limit": 3})
+    c.registrar_insercao("propostas", "ana", ("c",))
+    assert c.get("lista_ana") == (True, [("c",), ("b",), ("a",)])
+    # Respeita o tamanho da página
+    c.registrar_insercao("propostas", "ana", ("d",))
+    assert c.get("lista_ana") == (True, [("d",), ("c",), ("b",)])
+    assert c.stats()["atualizacoes"] == 2
+
+def test_insercao_invalida_o_que_nao_e_primeira_pagina():
+    c = _cache()
+    c.put("contagem_ana", 2, ("propostas",), "ana")
+    c.put("filtro_ana", [("a",)], ("propostas",), "ana", meta={})
+    c.registrar_insercao("propostas", "ana", ("c",))
+    assert c.get("contagem_ana") == (False, None)
+    assert c.get("filtro_ana") == (False, None)
+    assert c.stats()["invalidacoes"] == 2
+
+def test_visao_de_admin_recebe_insercao_de_qualquer_dono():
+    c = _cache()
+    c.put("lista_admin", [("a",)], ("propostas",), None, meta={"prepend_limit": 5})
+    c.registrar_insercao("propostas", "ana", ("b",))
+    assert c.get("lista_admin") == (True, [("b",), ("a",)])
+
+# ----------------------------------------------------------------------------
+# Invalidação por dono
+# ----------------------------------------------------------------------------
+def test_escrita_de_um_dono_nao_mexe_no_cache_de_outro():
+    c = _cache()
+    c.put("lista_ana", [("a",)], ("propostas",), "ana", meta={"prepend_limit": 5})
+    c.put("lista_bia", [("x",)], ("propostas",), "bia", meta={"prepend_limit": 5})
+    c.registrar_insercao("propostas", "ana", ("b",))
+    c.invalidar("propostas", "ana")
+    assert c.get("lista_bia") == (True, [("x",)])
+    assert c.get("lista_ana") == (False, None)
+
+def test_invalidar_sem_dono_derruba_todos_da_tabela():
+    c = _cache()
+    c.put("p_ana", 1, ("propostas",), "ana")
+    c.put("p_bia", 2, ("propostas",), "bia")
+    c.put("p_admin", 3, ("propostas",), None)
+    c.put("r_ana", 4, ("reunioes_efetivadas",), "ana")
+    c.invalidar("propostas")
+    assert [c.get(k)[0] for k in ("p_ana", "p_bia", "p_admin", "r_ana")] == [False, False, False, True]
+
+def test_entrada_de_varias_tabelas_cai_com_qualquer_uma():
+    c = _cache()
+    c.put("busca_ana", [], ("propostas", "contatos_efetivos"), "ana")
+    c.invalidar("contatos_efetivos", "ana")
+    assert c.get("busca_ana") == (False, None)
+
+# ----------------------------------------------------------------------------
+# Gerações (leitura que cruzou com uma escrita não é guardada)
+# ----------------------------------------------------------------------------
+def test_put_descarta_leitura_que_cruzou_com_escrita_do_mesmo_dono():
+    c = _cache()
+    geracao = c.geracao(("propostas",), "ana")
+    c.registrar_insercao("propostas", "ana", ("nova",))  # escrita no meio da consulta
+    c.put("lista_ana", [("velha",)], ("propostas",), "ana", geracao=geracao)
+    assert c.get("lista_ana") == (False, None)
+    assert c.stats()["descartes"] == 1
+
+def test_put_guarda_quando_escrita_foi_de_outro_dono():
+    c = _cache()
+    geracao = c.geracao(("propostas",), "ana")
+    c.invalidar("propostas", "bia")
+    c.put("lista_ana", [("a",)], ("propostas",), "ana", geracao=geracao)
+    assert c.get("lista_ana") == (True, [("a",)])
+
+def test_geracao_de_admin_e_invalidacao_global():
+    c = _cache()
+    # Admin enxerga todos os donos: qualquer escrita na tabela invalida a leitura
+    geracao = c.geracao(("propostas",), None)
+    c.invalidar("propostas", "bia")
+    c.put("lista_admin", [], ("propostas",), None, geracao=geracao)
+    assert c.get("lista_admin") == (False, None)
+    # Escrita sem dono (ex.: importação em massa) afeta a leitura de qualquer dono
+    geracao = c.geracao(("propostas",), "ana")
+    c.invalidar("propostas")
+    c.put("lista_ana", [], ("propostas",), "ana", geracao=geracao)
+    assert c.get("lista_ana") == (False, None)
+
+def test_limpar_invalida_leituras_em_andamento():
+    c = _cache()
+    geracao = c.geracao(("propostas",), "ana")
+    c.limpar()
+    c.put("lista_ana", [], ("propostas",), "ana", geracao=geracao)
+    assert c.get("lista_ana") == (False, None)
+
+# ----------------------------------------------------------------------------
+# TTL / LRU
+# ----------------------------------------------------------------------------
+def test_entrada_expira_pelo_ttl(monkeypatch):
+    c = _cache(ttl=10.0)
+    agora = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: agora[0])
+    c.put("k", 1, ("propostas",), "ana")
+    agora[0] += 9.9
+    assert c.get("k") == (True, 1)
+    agora[0] += 0.2
+    assert c.get("k") == (False, None)
+    assert c.stats()["entradas"] == 0
+
+def test_lru_descarta_a_menos_usada():
+    c = _cache(maxsize=2)
+    c.put("a", 1, ("propostas",), None)
+    c.put("b", 2, ("propostas",), None)
+    c.get("a")
+    c.put("c", 3, ("propostas",), None)
+    assert [c.get(k)[0] for k in ("a", "b", "c")] == [True, False, True]
@@ -0,0 +1,176 @@
+# test_fila.py — Yassaka | Fila local de escritas: lease, backoff, itens com erro, idempotência
+import types
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import fila as fila_mod
+
+class Envio:
+    # Substitui db.aplicar_escritas: guarda os lotes e responde o que o teste mandar
+    def __init__(self):
+        self.lotes = []
+        self.resposta = None  # None = tudo aplicado; Exception = falha transitória; dict = falhas
+
+    def __call__(self, itens):
+        self.lotes.append(itens)
+        if isinstance(self.resposta, Exception):
+            raise self.resposta
+        falhas = self.resposta or {}
+        return [chave for chave, _, _ in itens if chave not in falhas], dict(falhas)
+
+@pytest.fixture
+def relogio():
+    return [1_000_000.0]
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch, relogio):
+    monkeypatch.setattr(fila_mod, "FILA_ARQUIVO", str(tmp_path / "fila.sqlite3"))
+    conn = fila_mod._conectar()
+    conn.executescript(fila_mod._SCHEMA)
+    conn.close()
+    # Sem a thread de envio: o teste drena a fila com enviar_pendentes()
+    monkeypatch.setattr(fila_mod, "_iniciada", True)
+    monkeypatch.setattr(fila_mod, "time", types.SimpleNamespace(time=lambda: relogio[0], monotonic=time.monotonic))
+    # Backoff sem jitter: sempre o teto do intervalo
+    monkeypatch.setattr(fila_mod.random, "uniform", lambda a, b: b)
+    return fila_mod
+
+@pytest.fixture
+def envio(fila, monkeypatch):
+    envio = Envio()
+    monkeypatch.setattr(fila, "aplicar_escritas", envio)
+    return envio
+
+def _linha(fila, chave):
+    conn = fila._conectar()
+    try:
+        return conn.execute(
+            "SELECT tentativas, proxima_em, erro, falhou FROM fila WHERE chave = ?;", (chave,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+# ----------------------------------------------------------------------------
+# Fluxo normal
+# ----------------------------------------------------------------------------
+def test_enfileira_envia_e_remove(fila, envio):
+    chave = fila.enfileirar("proposta", "ana", cliente="ACME", valor=Decimal("10.50"), data=date(2025, 1, 2))
+    assert fila.status_fila("ana")["pendentes"] == 1
+    assert fila.enviar_pendentes() == 1
+    [(enviada, operacao, dados)] = envio.lotes[0]
+    assert (enviada, operacao) == (chave, "proposta")
+    # Decimal e date voltam com o tipo original
+    assert dados == {"cliente": "ACME", "valor": Decimal("10.50"), "data": date(2025, 1, 2)}
+    assert _linha(fila, chave) is None
+    assert fila.aguardar(chave, timeout=0) == ("sincronizado", None)
+
+def test_status_por_dono(fila, envio):
+    fila.enfileirar("contato", "ana", cliente="A")
+    fila.enfileirar("contato", "bia", cliente="B")
+    assert fila.status_fila("ana")["pendentes"] == 1
+    assert fila.status_fila()["pendentes"] == 2
+
+# ----------------------------------------------------------------------------
+# Lease
+# ----------------------------------------------------------------------------
+def test_lote_reservado_nao_e_pego_de_novo_ate_o_lease_vencer(fila, relogio):
+    fila.enfileirar("contato", "ana", cliente="A")
+    assert len(fila._reservar_lote()) == 1
+    # Outro processo (ou a próxima volta do loop) não pega o mesmo item...
+    assert fila._reservar_lote() == []
+    relogio[0] += fila.LEASE - 1
+    assert fila._reservar_lote() == []
+    # ...até o processo que reservou sumir sem concluir
+    relogio[0] += 2
+    assert len(fila._reservar_lote()) == 1
+
+def test_lote_respeita_tamanho_e_ordem(fila, monkeypatch):
+    monkeypatch.setattr(fila, "TAM_LOTE", 2)
+    chaves = [fila.enfileirar("contato", "ana", cliente=str(i)) for i in range(3)]
+    assert [c for _, c, *_ in fila._reservar_lote()] == chaves[:2]
+    assert [c for _, c, *_ in fila._reservar_lote()] == chaves[2:]
+
+# ----------------------------------------------------------------------------
+# Backoff (falha transitória: banco fora, timeout)
+# ----------------------------------------------------------------------------
+def test_falha_transitoria_adia_com_backoff_exponencial(fila, envio, relogio):
+    chave = fila.enfileirar("proposta", "ana", cliente="ACME")
+    envio.resposta = ConnectionError("servidor suspenso")
+    inicio = relogio[0]
+
+    assert fila.enviar_pendentes() == 0
+    tentativas, proxima, erro, falhou = _linha(fila, chave)
+    assert (tentativas, falhou) == (1, 0)
+    assert proxima == inicio + fila.BACKOFF_BASE
+    assert "ConnectionError" in erro
+
+    # Antes do prazo nada é reenviado
+    assert fila.enviar_pendentes() == 0
+    assert len(envio.lotes) == 1
+
+    relogio[0] = proxima
+    fila.enviar_pendentes()
+    tentativas, proxima, _, _ = _linha(fila, chave)
+    assert tentativas == 2
+    assert proxima == relogio[0] + fila.BACKOFF_BASE * 2
+    assert fila.aguardar(chave, timeout=0) == ("pendente", None)
+
+def test_backoff_tem_teto(fila, envio, relogio):
+    chave = fila.enfileirar("proposta", "ana", cliente="ACME")
+    envio.resposta = ConnectionError()
+    for _ in range(20):
+        relogio[0] = _linha(fila, chave)[1]
+        fila.enviar_pendentes()
+    assert _linha(fila, chave)[1] - relogio[0] == fila.BACKOFF_MAX
+
+# ----------------------------------------------------------------------------
+# Itens com erro (erro do próprio dado não é repetido)
+# ----------------------------------------------------------------------------
+def test_erro_permanente_marca_item_e_nao_reenvia(fila, envio, relogio):
+    ruim = fila.enfileirar("proposta", "ana", cliente="ACME", valor=Decimal("-1"))
+    bom = fila.enfileirar("proposta", "ana", cliente="ACME", valor=Decimal("1"))
+    envio.resposta = {ruim: "valor inválido"}
+
+    assert fila.enviar_pendentes() == 2
+    assert _linha(fila, bom) is None
+    assert _linha(fila, ruim)[2:] == ("valor inválido", 1)
+    assert fila.aguardar(ruim, timeout=0) == ("erro", "valor inválido")
+
+    status = fila.status_fila("ana")
+    assert (status["pendentes"], status["com_erro"]) == (0, 1)
+    assert [e[0] for e in status["erros"]] == [ruim]
+
+    relogio[0] += fila.BACKOFF_MAX * 10
+    envio.resposta = None
+    assert fila.enviar_pendentes() == 0
+    assert len(envio.lotes) == 1
+
+    fila.descartar(ruim)
+    assert fila.status_fila("ana")["com_erro"] == 0
+
+def test_descartar_nao_remove_item_pendente(fila):
+    chave = fila.enfileirar("contato", "ana", cliente="A")
+    fila.descartar(chave)
+    assert fila.status_fila("ana")["pendentes"] == 1
+
+# ----------------------------------------------------------------------------
+# Idempotência
+# ----------------------------------------------------------------------------
+def test_reenvio_usa_a_mesma_chave(fila, envio, relogio):
+    # Falha depois do banco já ter aplicado (ex.: conexão caiu no COMMIT): o
+    # reenvio leva a mesma chave, e aplicar_escritas a reconhece como já aplicada
+    chave = fila.enfileirar("reuniao", "ana", cliente="ACME")
+    envio.resposta = ConnectionError()
+    fila.enviar_pendentes()
+    relogio[0] = _linha(fila, chave)[1]
+    envio.resposta = None
+    assert fila.enviar_pendentes() == 1
+    assert [lote[0][0] for lote in envio.lotes] == [chave, chave]
+    assert envio.lotes[0] == envio.lotes[1]
+
+def test_chaves_sao_unicas_por_item(fila):
+    chaves = {fila.enfileirar("contato", "ana", cliente="A") for _ in range(5)}
+    assert len(chaves) == 5
@@ -0,0 +1,46 @@
+# test_importacao.py — Yassaka | Parsing vetorizado de valores em R$ (importação em massa)
+from decimal import ROUND_HALF_UP, Decimal
+
+import pandas as pd
+import pytest
+
+from importacao import _valor_fora_do_limite, parse_valor_brl_series
+
+ENTRADAS = [
+    "1.234,56", "1234,56", "1234.56", "R$ 1.234,5", "R$1,005", " 10 ", "\xa01,5\xa0",
+    "1 234,56", "1.234.567,89", "99.999.999.999.999,99", "-5,005", "+5", ".5", "5.",
+    "0,004", "12,3.4", "abc", "", "1,2,3", "R$", "Infinity", "1,2a",
+]
+
+@pytest.fixture(scope="module")
+def parse_app():
+    # app.py é o script do Streamlit: importar roda a página em "bare mode", sem sessão
+    from app import _parse_valor_brl
+    return _parse_valor_brl
+
+def _arredondar(v) -> Decimal | None:
+    # O cast ::numeric(18,2) do Postgres arredonda como ROUND_HALF_UP
+    return None if v is pd.NA else Decimal(v).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+def test_mesmo_resultado_do_parser_do_app(parse_app):
+    serie = parse_valor_brl_series(pd.Series(ENTRADAS))
+    assert [_arredondar(v) for v in serie] == [parse_app(txt) for txt in ENTRADAS]
+
+@pytest.mark.parametrize("txt", ["1e3", "NaN"])
+def test_notacao_cientifica_e_nan_sao_recusados(parse_app, txt):
+    # Aqui a importação é mais estrita que o filtro da tela (Decimal() aceita)
+    assert parse_app(txt) is not None
+    assert parse_valor_brl_series(pd.Series([txt])).isna().all()
+
+def test_celula_vazia_vira_na_e_preserva_indice():
+    serie = pd.Series([None, "1,50", float("nan")], index=[10, 11, 12])
+    resultado = parse_valor_brl_series(serie)
+    assert list(resultado.index) == [10, 11, 12]
+    assert resultado.isna().tolist() == [True, False, True]
+    assert resultado[11] == "1.50"
+
+def test_limite_do_numeric_18_2_considera_o_arredondamento():
+    valor = parse_valor_brl_series(pd.Series([
+        "9.999.999.999.999.999,99", "9.999.999.999.999.999,995", "10000000000000000,00", "-1234,5",
+    ]))
+    assert _valor_fora_do_limite(valor).tolist() == [False, True, True, False]